@@ -1,24 +1,77 @@
+import json
 import openpyxl
+import os
+import struct
 import sys
+import time
+import tracemalloc
+import numpy as np
 sys.setrecursionlimit(1000000000)
+
+# 保存/加载用的分页格式与 最终代码/Rstartree.py 的 RStarTreeDisk 共用 最终代码/page_format.py 中的定义
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "最终代码"))
+from page_format import (CUBOID_LEAF_CODE, HEADER_SIZE, HEADER_STRUCT, INDEX_MAGIC, INDEX_VERSION, INTERNAL_DTYPE,
+                         LEAF_FORMATS, LEAF_PAGE_DTYPES, MIN_FILL, NODE_HEADER_SIZE, NODE_HEADER_STRUCT,
+                         internal_capacity, leaf_capacity)
+
+TREE_FILE = "r3star.idx"
+MEMORY_STRUCT = "=4siid"            # 超级块中紧跟文件头的内存树参数：魔数、最大条目数、最小条目数、重插比例
+MEMORY_MAGIC = b"R3MT"
+DISK_AXES = [1, 0, 2]               # 内存树坐标为 (纬度, 经度, 海拔)，磁盘点索引为 (经度, 纬度, 海拔)，互换前两轴
+POINT_LEAF_CODE = LEAF_FORMATS["point"]
+MIN_PAGE_SIZE = 512                  # 最小页长，保证每页至少放下 RStarTreeDisk 要求的4个条目
+XLSX_COLUMNS = (0, 1, 3)            # 表格中 x, y, z 所在列（从0起）
+PLT_COLUMNS = (0, 1, 3)             # .plt 中 纬度, 经度, 海拔 所在列
+PLT_HEADER_LINES = 6
+CACHE_SUFFIX = ".cols.npy"          # 按列缓存的轨迹点，旁边的 .json 记录源文件大小和修改时间
 class Cuboid:
-    def __init__(self, x1, y1, z1, x2, y2, z2):
-        self.x1, self.y1, self.z1 = x1, y1, z1  # 左下前角坐标
-        self.x2, self.y2, self.z2 = x2, y2, z2  # 右后上角坐标
+    def __init__(self, x1, y1, z1, x2, y2, z2, ref=None):
+        # 两个对角点可能以任意顺序给出（如轨迹相邻两点），统一成左下前角和右后上角
+        self.x1, self.y1, self.z1 = min(x1, x2), min(y1, y2), min(z1, z2)  # 左下前角坐标
+        self.x2, self.y2, self.z2 = max(x1, x2), max(y1, y2), max(z1, z2)  # 右后上角坐标
+        self.ref = ref  # 附带的数据引用，如磁盘索引叶子条目的 (数据块号, 块内位置)
 
     def volume(self):
         """计算长方体的体积"""
         return abs(self.x2 - self.x1) * abs(self.y2 - self.y1) * abs(self.z2 - self.z1)
 
+    def margin(self):
+        """计算长方体的边长之和（R*分裂时的周长指标）"""
+        return (self.x2 - self.x1) + (self.y2 - self.y1) + (self.z2 - self.z1)
+
+    def center(self):
+        """计算长方体的中心点"""
+        return ((self.x1 + self.x2) / 2, (self.y1 + self.y2) / 2, (self.z1 + self.z2) / 2)
+
+    def contains(self, other):
+        """判断是否完全包含另一个长方体"""
+        return (self.x1 <= other.x1 and self.y1 <= other.y1 and self.z1 <= other.z1 and
+                self.x2 >= other.x2 and self.y2 >= other.y2 and self.z2 >= other.z2)
+
+    def intersects(self, other):
+        """判断是否与另一个长方体相交（边界相接也算）"""
+        return (self.x1 <= other.x2 and other.x1 <= self.x2 and self.y1 <= other.y2 and
+                other.y1 <= self.y2 and self.z1 <= other.z2 and other.z1 <= self.z2)
+
+    def to_tuple(self):
+        return (self.x1, self.y1, self.z1, self.x2, self.y2, self.z2)
+
+    @classmethod
+    def from_bounds(cls, bounds):
+        """由已规整（下角在前）的 n×6 数组批量生成长方体，跳过逐个比较大小"""
+        cuboids = []
+        for x1, y1, z1, x2, y2, z2 in np.asarray(bounds, dtype=np.float64).reshape(-1, 6).tolist():
+            c = cls.__new__(cls)
+            c.x1, c.y1, c.z1, c.x2, c.y2, c.z2, c.ref = x1, y1, z1, x2, y2, z2, None
+            cuboids.append(c)
+        return cuboids
+
     def overlap(self, other):
         """计算与另一个长方体的重叠体积"""
-        x_overlap = max(0, abs(min(self.x2, other.x2) - max(self.x1, other.x1)))
-        y_overlap = max(0, abs(min(self.y2, other.y2) - max(self.y1, other.y1)))
-        z_overlap = max(0, abs(min(self.z2, other.z2) - max(self.z1, other.z1)))
-        if x_overlap==0 and y_overlap==0 and z_overlap==0:
-            return 0
-        else:
-            return x_overlap * y_overlap * z_overlap
+        x_overlap = max(0, min(self.x2, other.x2) - max(self.x1, other.x1))
+        y_overlap = max(0, min(self.y2, other.y2) - max(self.y1, other.y1))
+        z_overlap = max(0, min(self.z2, other.z2) - max(self.z1, other.z1))
+        return x_overlap * y_overlap * z_overlap
 
     def merge(self, other):
         """合并两个长方体，生成包含二者的最小边界长方体（MBC）"""
@@ -34,11 +87,13 @@ class Cuboid:
         return f"Cuboid({self.x1}, {self.y1}, {self.z1}, {self.x2}, {self.y2}, {self.z2})"
 
 class R3StarTreeNode:
-    def __init__(self, is_leaf=False):
+    def __init__(self, is_leaf=False, level=0):
         self.is_leaf = is_leaf        # 是否为叶子节点
+        self.level = level            # 所在层，叶子为0
         self.cuboids = []             # 节点中的长方体（MBC）
         self.children = []            # 子节点（如果是非叶子节点）
         self.parent = None            # 父节点
+        self.mbc = None               # 缓存的节点MBC，插入时沿路径增量更新
 
     def compute_mbc(self):
         """计算节点的最小边界长方体（MBC）"""
@@ -56,110 +111,182 @@ class R3StarTreeNode:
         """添加子节点并更新父子关系"""
         self.children.append(child)
         child.parent = self
-        self.cuboids.append(child.compute_mbc())  # 更新当前节点的MBC
+        mbc = child.mbc or child.compute_mbc()
+        self.cuboids.append(mbc)  # 更新当前节点的MBC
+        self.mbc = mbc if self.mbc is None else self.mbc.merge(mbc)
 
     def __repr__(self):
         return f"Node(Leaf={self.is_leaf}, MBCs={self.cuboids})"
 
 
 class R3StarTree:
-    def __init__(self, max_entries=4, min_entries=2):
+    def __init__(self, max_entries=4, min_entries=2, reinsert_fraction=0.3):
         self.max_entries = max_entries  # 节点最大条目数
         self.min_entries = min_entries  # 节点最小条目数
+        self.reinsert_fraction = reinsert_fraction
+        self.reinsert_count = max(1, round(max_entries * reinsert_fraction))  # 强制重插的条目数
         self.root = R3StarTreeNode(is_leaf=True)  # 根节点初始为叶子
+        self.size = 0
+        self._reinserted = set()
 
     def insert(self, cuboid):
         """插入一个长方体到R*树"""
-        leaf = self._choose_leaf(self.root, cuboid)
-        leaf.cuboids.append(cuboid)
-
-        # 如果节点溢出，进行分裂或重新插入
-        if len(leaf.cuboids) > self.max_entries:
-            self._handle_overflow(leaf)
-
-    def _choose_leaf(self, node, cuboid):
-        """迭代选择插入的叶子节点（基于最小体积扩展）"""
-        current_node = node
-        while True:
-            if current_node.is_leaf:
-                return current_node
-
-            min_volume_increase = float('inf')
-            best_child = None
-
-            # 遍历子节点，选择体积扩展最小的子节点
-            for child in current_node.children:
-                mbc = child.compute_mbc()
-                merged_mbc = mbc.merge(cuboid) if mbc else cuboid
-                volume_increase = merged_mbc.volume() - (mbc.volume() if mbc else 0)
-
-                if volume_increase < min_volume_increase:
-                    min_volume_increase = volume_increase
-                    best_child = child
-
-            if best_child is None:
-                break  # 没有找到子节点，返回当前节点
-            else:
-                current_node = best_child
-
-        return current_node
+        self._reinserted = set()  # 本次插入中已做过强制重插的层
+        self._insert(cuboid, None, 0)
+        self.size += 1
+
+    def _insert(self, cuboid, child, level):
+        """把条目插入第 level 层的节点，child 不为空时条目代表一棵子树"""
+        node = self._choose_subtree(cuboid, level)
+        node.cuboids.append(cuboid)
+        if child is not None:
+            node.children.append(child)
+            child.parent = node
+        self._extend_path(node, cuboid)
+
+        # 如果节点溢出，进行重新插入或分裂
+        if len(node.cuboids) > self.max_entries:
+            self._handle_overflow(node)
+
+    def _choose_subtree(self, cuboid, level):
+        """从根向下选择插入节点：孩子是叶子时取重叠扩展最小，否则取体积扩展最小"""
+        node = self.root
+        while node.level > level:
+            best = None
+            best_cost = None
+            for i, mbc in enumerate(node.cuboids):
+                merged = mbc.merge(cuboid)
+                enlargement = merged.volume() - mbc.volume()
+                if node.level == 1:
+                    overlap_increase = sum(merged.overlap(other) - mbc.overlap(other)
+                                           for j, other in enumerate(node.cuboids) if j != i)
+                    cost = (overlap_increase, enlargement, mbc.volume())
+                else:
+                    cost = (enlargement, mbc.volume())
+                if best_cost is None or cost < best_cost:
+                    best, best_cost = i, cost
+            node = node.children[best]
+        return node
+
+    def _extend_path(self, node, cuboid):
+        """沿到根的路径扩大缓存的MBC，遇到已包含新条目的节点即停止"""
+        while node is not None:
+            if node.mbc is not None and node.mbc.contains(cuboid):
+                break
+            node.mbc = cuboid if node.mbc is None else node.mbc.merge(cuboid)
+            parent = node.parent
+            if parent is not None:
+                parent.cuboids[parent.children.index(node)] = node.mbc
+            node = parent
+
+    def _refresh_path(self, node):
+        """条目被移走后沿路径重新收紧MBC"""
+        while node is not None:
+            node.mbc = node.compute_mbc()
+            parent = node.parent
+            if parent is not None:
+                parent.cuboids[parent.children.index(node)] = node.mbc
+            node = parent
 
     def _handle_overflow(self, node):
-        """处理节点溢出（优先重新插入，否则分裂）"""
-        # 强制重新插入部分条目（优化策略）
-        entries_to_reinsert = node.cuboids[self.max_entries - self.min_entries:]
-        node.cuboids = node.cuboids[:self.min_entries]
-
-        # 直接分裂节点，避免重新插入导致递归
-        self._split_node(node)
+        """处理节点溢出（每层每次插入先强制重新插入一次，否则分裂）"""
+        if node is not self.root and node.level not in self._reinserted:
+            self._reinserted.add(node.level)
+            self._reinsert(node)
+        else:
+            self._split_node(node)
+
+    def _reinsert(self, node):
+        """移走离节点中心最远的若干条目，再由近到远重新插入同一层"""
+        cx, cy, cz = node.mbc.center()
+        def distance(i):
+            x, y, z = node.cuboids[i].center()
+            return (x - cx) ** 2 + (y - cy) ** 2 + (z - cz) ** 2
+        order = sorted(range(len(node.cuboids)), key=distance, reverse=True)
+        removed = set(order[:self.reinsert_count])
+        entries = [(node.cuboids[i], node.children[i] if not node.is_leaf else None) for i in order[:self.reinsert_count]]
+        kept = [i for i in range(len(node.cuboids)) if i not in removed]
+        if not node.is_leaf:
+            node.children = [node.children[i] for i in kept]
+        node.cuboids = [node.cuboids[i] for i in kept]
+        self._refresh_path(node)
+        for cuboid, child in reversed(entries):
+            self._insert(cuboid, child, node.level)
 
     def _split_node(self, node):
-        """三维分裂策略（迭代处理父节点溢出）"""
-        while True:
-            # --- 原分裂逻辑（计算最佳分裂轴）---
-            best_axis = None
-            best_cost = float('inf')
-            for axis in ['x', 'y', 'z']:
-                sorted_entries = sorted(node.cuboids, key=lambda c: getattr(c, f"{axis}1"))
-                split_index = len(sorted_entries) // 2
-                group1 = sorted_entries[:split_index]
-                group2 = sorted_entries[split_index:]
-                mbc1 = self._merge_all(group1)
-                mbc2 = self._merge_all(group2)
-                total_volume = mbc1.volume() + mbc2.volume()
-                if total_volume < best_cost:
-                    best_cost = total_volume
-                    best_axis = axis
-
-            # --- 执行分裂 ---
-            sorted_entries = sorted(node.cuboids, key=lambda c: getattr(c, f"{best_axis}1"))
-            split_index = len(sorted_entries) // 2
-
-            new_node = R3StarTreeNode(is_leaf=node.is_leaf)
-            new_node.cuboids = sorted_entries[split_index:]
-            new_node.children = node.children[split_index:] if not node.is_leaf else []
-
-            node.cuboids = sorted_entries[:split_index]
-            node.children = node.children[:split_index] if not node.is_leaf else []
-
-            # --- 更新父节点（迭代处理父节点溢出）---
-            if node.parent is None:
-                # 根节点分裂，创建新根
-                new_root = R3StarTreeNode()
-                new_root.add_child(node)
-                new_root.add_child(new_node)
-                self.root = new_root
-                break
-            else:
-                # 将新节点添加到父节点
-                parent = node.parent
-                parent.add_child(new_node)
+        """R*分裂：先按周长之和选分裂轴，再在该轴上选重叠最小（其次体积最小）的分配"""
+        entries = list(zip(node.cuboids, node.children if not node.is_leaf else [None] * len(node.cuboids)))
+        group1, group2 = self._choose_split(entries)
+
+        new_node = R3StarTreeNode(is_leaf=node.is_leaf, level=node.level)
+        new_node.cuboids = [c for c, _ in group2]
+        node.cuboids = [c for c, _ in group1]
+        if not node.is_leaf:
+            new_node.children = [child for _, child in group2]
+            node.children = [child for _, child in group1]
+            for child in new_node.children:
+                child.parent = new_node
+        node.mbc = node.compute_mbc()
+        new_node.mbc = new_node.compute_mbc()
+
+        if node.parent is None:
+            # 根节点分裂，创建新根
+            new_root = R3StarTreeNode(level=node.level + 1)
+            new_root.add_child(node)
+            new_root.add_child(new_node)
+            self.root = new_root
+            return
+        # 将新节点添加到父节点，父节点的MBC不变
+        parent = node.parent
+        parent.cuboids[parent.children.index(node)] = node.mbc
+        parent.children.append(new_node)
+        parent.cuboids.append(new_node.mbc)
+        new_node.parent = parent
+        if len(parent.cuboids) > self.max_entries:
+            self._handle_overflow(parent)
+
+    def _choose_split(self, entries):
+        """返回分裂后的两组 (长方体, 子节点)"""
+        m = self.min_entries
+        n = len(entries)
+        best_axis, best_margin = None, float('inf')
+        for axis in ['x', 'y', 'z']:
+            margin = 0
+            for sorted_entries in self._axis_sorts(entries, axis):
+                prefix, suffix = self._prefix_suffix(sorted_entries)
+                for k in range(m, n - m + 1):
+                    margin += prefix[k - 1].margin() + suffix[k].margin()
+            if margin < best_margin:
+                best_axis, best_margin = axis, margin
+
+        best_split, best_cost = None, None
+        for sorted_entries in self._axis_sorts(entries, best_axis):
+            prefix, suffix = self._prefix_suffix(sorted_entries)
+            for k in range(m, n - m + 1):
+                cost = (prefix[k - 1].overlap(suffix[k]), prefix[k - 1].volume() + suffix[k].volume())
+                if best_cost is None or cost < best_cost:
+                    best_cost = cost
+                    best_split = (sorted_entries[:k], sorted_entries[k:])
+        return best_split
+
+    @staticmethod
+    def _axis_sorts(entries, axis):
+        """按某轴下界、上界各排一次序"""
+        return (sorted(entries, key=lambda e: (getattr(e[0], f"{axis}1"), getattr(e[0], f"{axis}2"))),
+                sorted(entries, key=lambda e: (getattr(e[0], f"{axis}2"), getattr(e[0], f"{axis}1"))))
+
+    @staticmethod
+    def _prefix_suffix(sorted_entries):
+        """前缀和后缀MBC，prefix[i] 覆盖前 i+1 个条目，suffix[i] 覆盖第 i 个及以后"""
+        prefix = [sorted_entries[0][0]]
+        for c, _ in sorted_entries[1:]:
+            prefix.append(prefix[-1].merge(c))
+        suffix = [sorted_entries[-1][0]]
+        for c, _ in reversed(sorted_entries[:-1]):
+            suffix.append(suffix[-1].merge(c))
+        suffix.reverse()
+        return prefix, suffix
 
-                # 检查父节点是否溢出，若溢出则继续分裂
-                if len(parent.cuboids) <= self.max_entries:
-                    break
-                else:
-                    node = parent  # 向上处理父节点
     def _merge_all(self, cuboids):
         """合并一组长方体为一个MBC"""
         if not cuboids:
@@ -172,29 +299,133 @@ class R3StarTree:
         z2 = max(c.z2 for c in cuboids)
         return Cuboid(x1, y1, z1, x2, y2, z2)
 
-    def search(self, query_cuboid):
-        """查询与给定长方体相交的所有条目"""
+    def search(self, query_cuboid, contained=False):
+        """查询与给定长方体相交（contained 为真时为完全落在其内）的所有条目，不相交的子树直接剪掉"""
         results = []
-
-        self._search_recursive(self.root, query_cuboid, results)
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node.is_leaf:
+                if contained:
+                    results.extend(c for c in node.cuboids if query_cuboid.contains(c))
+                else:
+                    results.extend(c for c in node.cuboids if c.intersects(query_cuboid))
+            else:
+                # 孩子的MBC已缓存在 cuboids 中，无需重新计算
+                stack.extend(child for mbc, child in zip(node.cuboids, node.children) if mbc.intersects(query_cuboid))
         return results
 
-    def _search_recursive(self, node, query_cuboid, results):
-        """递归搜索"""
-        print(f"当前节点: {node}")
-        if node.is_leaf:
-            print("叶子节点，检查长方体...")
-            for cuboid in node.cuboids:
-                print(f"检查长方体: {cuboid}, 重叠体积: {cuboid.overlap(query_cuboid)}")
-                if cuboid.overlap(query_cuboid) >= 0:
-                    results.append(cuboid)
-        else:
-            print("非叶子节点，递归搜索子节点...")
-            for child in node.children:
-                mbc = child.compute_mbc()
-                print(f"子节点 MBC: {mbc}, 重叠体积: {mbc.overlap(query_cuboid)}")
-                if mbc.overlap(query_cuboid) >= 0:
-                    self._search_recursive(child, query_cuboid, results)
+    def freeze(self):
+        """把指针结构的树压平成只读的数组快照，见 FrozenR3StarTree"""
+        return FrozenR3StarTree(self)
+
+    def save(self, path=TREE_FILE, page_size=None):
+        """把整棵树一次写成分页文件：叶子页用线段长方体格式（CUBOID_LEAF_CODE），超级块后附内存树参数；
+        RStarTreeDisk 会拒绝打开这种文件，它只用于 load"""
+        self._write_pages(path, page_size or tree_page_size(self.max_entries), CUBOID_LEAF_CODE)
+
+    def to_disk(self, index_path, page_size=None):
+        """转换成 RStarTreeDisk 的点索引：要求每个叶子条目都是带 ref（数据块号, 块内位置）的点，
+        例如由磁盘索引 load 得到后再插入点的树；按磁盘轴序写 point 格式叶子，用原来的数据文件打开"""
+        self._write_pages(index_path, page_size or tree_page_size(self.max_entries), POINT_LEAF_CODE)
+
+    def _write_pages(self, path, page_size, leaf_code):
+        """层序分配页号（根为第1页）后一次写出；内部条目带子树条目数和下角坐标和"""
+        to_disk = leaf_code != CUBOID_LEAF_CODE
+        nodes = [self.root]
+        for node in nodes:
+            if not node.is_leaf:
+                nodes.extend(node.children)
+        leaf_dtype = LEAF_PAGE_DTYPES[leaf_code]
+        leaf_cap, internal_cap = leaf_capacity(page_size, leaf_code), internal_capacity(page_size)
+        if max(len(node.cuboids) for node in nodes) > min(leaf_cap, internal_cap):
+            raise ValueError(f"页长 {page_size} 放不下 {self.max_entries} 个条目")
+        axes = DISK_AXES + [a + 3 for a in DISK_AXES] if to_disk else list(range(6))
+        page_of = {id(node): i + 1 for i, node in enumerate(nodes)}
+        buf = bytearray(page_size * (len(nodes) + 1))
+        struct.pack_into(HEADER_STRUCT, buf, 0, INDEX_MAGIC, INDEX_VERSION, page_size, leaf_cap, internal_cap,
+                         1, len(nodes) + 1, 0, leaf_code)
+        if not to_disk:
+            struct.pack_into(MEMORY_STRUCT, buf, HEADER_SIZE, MEMORY_MAGIC, self.max_entries, self.min_entries,
+                             self.reinsert_fraction)
+        aggregates = {}  # 节点 -> (子树条目数, 下角坐标和)，自底向上累计
+        ordinal = 0
+        for node in reversed(nodes):
+            mbrs = np.array([c.to_tuple() for c in node.cuboids], dtype=np.float64).reshape(-1, 6)[:, axes]
+            if node.is_leaf:
+                refs = [c.ref for c in node.cuboids]
+                if to_disk and (np.any(mbrs[:, :3] != mbrs[:, 3:]) or None in refs):
+                    raise ValueError("只有带数据引用的点才能转换成磁盘点索引，线段长方体请用 save 保存")
+                records = np.zeros(len(refs), leaf_dtype)
+                records["block"], records["index"] = np.array(
+                    [ref if ref is not None else (-1, ordinal + i) for i, ref in enumerate(refs)], dtype=np.int64
+                ).reshape(-1, 2).T
+                ordinal += len(records)
+                if to_disk:
+                    records["pt"] = mbrs[:, :3]
+                else:
+                    records["mbr"] = mbrs
+                aggregates[id(node)] = (len(records), mbrs[:, :3].sum(axis=0))
+            else:
+                records = np.zeros(len(node.cuboids), INTERNAL_DTYPE)
+                records["mbr"] = mbrs
+                records["child"] = [page_of[id(child)] for child in node.children]
+                records["count"] = [aggregates[id(child)][0] for child in node.children]
+                records["sum"] = [aggregates[id(child)][1] for child in node.children]
+                aggregates[id(node)] = (int(records["count"].sum()), records["sum"].sum(axis=0))
+            offset = page_of[id(node)] * page_size
+            struct.pack_into(NODE_HEADER_STRUCT, buf, offset, page_of[id(node)], node.is_leaf,
+                             leaf_code if node.is_leaf else 0, len(records))
+            data = records.tobytes()
+            buf[offset + NODE_HEADER_SIZE:offset + NODE_HEADER_SIZE + len(data)] = data
+        with open(path, "wb") as f:
+            f.write(buf)
+
+    @classmethod
+    def load(cls, path=TREE_FILE):
+        """整个文件一次读入后按层序重建节点，不做逐条插入。
+        可加载 save 保存的文件，也可加载 RStarTreeDisk 建好的 point/mbr 格式点索引（坐标换回内存树的轴序）"""
+        with open(path, "rb") as f:
+            buf = f.read()
+        magic, version, page_size, leaf_cap, internal_cap, root_page, _, _, _ = struct.unpack_from(HEADER_STRUCT, buf, 0)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            raise ValueError(f"{path} 不是有效的索引文件（版本 {version}，需要 {INDEX_VERSION}）")
+        memory_magic, max_entries, min_entries, reinsert_fraction = struct.unpack_from(MEMORY_STRUCT, buf, HEADER_SIZE)
+        from_disk = memory_magic != MEMORY_MAGIC
+        if from_disk:  # RStarTreeDisk 建的索引：按页容量取参数
+            max_entries = max(leaf_cap, internal_cap)
+            min_entries, reinsert_fraction = max(2, int(max_entries * MIN_FILL)), 0.3
+        axes = DISK_AXES + [a + 3 for a in DISK_AXES] if from_disk else list(range(6))
+        tree = cls(max_entries, min_entries, reinsert_fraction)
+        queue = [(root_page, tree.root)]
+        for page_id, node in queue:  # 层序遍历，边遍历边追加孩子
+            _, is_leaf, code, count = struct.unpack_from(NODE_HEADER_STRUCT, buf, page_id * page_size)
+            offset = page_id * page_size + NODE_HEADER_SIZE
+            node.is_leaf = is_leaf
+            if not is_leaf:
+                raw = np.frombuffer(buf, INTERNAL_DTYPE, count, offset)
+                for box, child_page in zip(raw["mbr"][:, axes].tolist(), raw["child"].tolist()):
+                    child = R3StarTreeNode()
+                    child.mbc = Cuboid(*box)
+                    child.parent = node
+                    node.cuboids.append(child.mbc)
+                    node.children.append(child)
+                    queue.append((child_page, child))
+                continue
+            if code not in (CUBOID_LEAF_CODE, LEAF_FORMATS["mbr"], POINT_LEAF_CODE):
+                raise ValueError(f"{path} 的叶子页是量化格式，只存近似坐标，请用 point 或 mbr 格式重建")
+            raw = np.frombuffer(buf, LEAF_PAGE_DTYPES[code], count, offset)
+            if code == POINT_LEAF_CODE:
+                boxes = [pt * 2 for pt in raw["pt"][:, axes[:3]].tolist()]
+            else:
+                boxes = raw["mbr"][:, axes].tolist()
+            refs = zip(raw["block"].tolist(), raw["index"].tolist())
+            node.cuboids = [Cuboid(*box, ref=ref if ref[0] >= 0 else None) for box, ref in zip(boxes, refs)]
+            tree.size += count
+        for _, node in reversed(queue):  # 叶子为第0层，自底向上定层号
+            node.level = 0 if node.is_leaf else node.children[0].level + 1
+        tree.root.mbc = tree.root.compute_mbc()
+        return tree
 
     def print_tree(self, node=None, level=0):
         """打印树结构"""
@@ -204,53 +435,215 @@ class R3StarTree:
         if not node.is_leaf:
             for child in node.children:
                 self.print_tree(child, level + 1)
+class FrozenR3StarTree:
+    """R*树的只读扁平快照：按层序把所有节点的条目MBC按列放进一个连续的 6×n 数组（x1,y1,z1,x2,y2,z2 各一行），
+    node_start/node_count 给出每个节点条目所在区间，child 对内部条目是孩子节点号、对叶子条目是叶子条目序号。
+    树是平衡的，叶子条目在层序中排在最后，序号 k 的条目就在 bounds 的 leaf_start + k 列；
+    不保留长方体对象，只另存一份整数数组 refs（每个叶子条目的 ref，没有时为 -1），查询时再生成长方体"""
+
+    def __init__(self, tree):
+        nodes = [tree.root]
+        for node in nodes:  # 层序遍历，边遍历边追加
+            if not node.is_leaf:
+                nodes.extend(node.children)
+        node_ids = {id(node): i for i, node in enumerate(nodes)}
+        total = sum(len(node.cuboids) for node in nodes)
+        self.bounds = np.empty((6, total), dtype=np.float64)
+        self.child = np.empty(total, dtype=np.int32)
+        self.node_start = np.empty(len(nodes), dtype=np.int32)
+        self.node_count = np.empty(len(nodes), dtype=np.int32)
+        self.is_leaf = np.empty(len(nodes), dtype=bool)
+        self.leaf_start = total - sum(len(node.cuboids) for node in nodes if node.is_leaf)
+        self.refs = np.full((total - self.leaf_start, 2), -1, dtype=np.int32)
+        pos = 0
+        for i, node in enumerate(nodes):
+            self.node_start[i], self.node_count[i], self.is_leaf[i] = pos, len(node.cuboids), node.is_leaf
+            for j, cuboid in enumerate(node.cuboids):
+                self.bounds[:, pos] = cuboid.to_tuple()
+                if node.is_leaf:
+                    self.child[pos] = pos - self.leaf_start
+                    if cuboid.ref is not None:
+                        self.refs[pos - self.leaf_start] = cuboid.ref
+                else:
+                    self.child[pos] = node_ids[id(node.children[j])]
+                pos += 1
+
+    @property
+    def nbytes(self):
+        """数组部分占用的字节数"""
+        return sum(a.nbytes for a in (self.bounds, self.child, self.node_start, self.node_count, self.is_leaf,
+                                      self.refs))
+
+    def search_ids(self, query_cuboid, contained=False):
+        """返回命中叶子条目的序号；树是平衡的，同一层的活跃节点条目拼在一起做一次向量化判断"""
+        qx1, qy1, qz1, qx2, qy2, qz2 = query_cuboid.to_tuple()
+        frontier = np.zeros(1 if len(self.node_start) else 0, dtype=np.int32)
+        while len(frontier):
+            if len(frontier) == 1:
+                start = self.node_start[frontier[0]]
+                idx = np.arange(start, start + self.node_count[frontier[0]])
+            else:  # 各活跃节点的条目区间展开成下标数组
+                counts = self.node_count[frontier]
+                idx = np.repeat(self.node_start[frontier] - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+            x1, y1, z1, x2, y2, z2 = self.bounds[:, idx]
+            mask = (x1 <= qx2) & (x2 >= qx1) & (y1 <= qy2) & (y2 >= qy1) & (z1 <= qz2) & (z2 >= qz1)
+            if self.is_leaf[frontier[0]]:
+                if contained:
+                    mask &= (x1 >= qx1) & (x2 <= qx2) & (y1 >= qy1) & (y2 <= qy2) & (z1 >= qz1) & (z2 <= qz2)
+                return self.child[idx[mask]]
+            frontier = self.child[idx[mask]]
+        return np.empty(0, dtype=np.int32)
+
+    def search(self, query_cuboid, contained=False):
+        """与 R3StarTree.search 相同的语义，返回由快照重建的长方体（坐标和 ref 相同，但不是原对象）"""
+        ids = self.search_ids(query_cuboid, contained)
+        cuboids = Cuboid.from_bounds(self.bounds[:, self.leaf_start + ids].T)
+        for c, ref in zip(cuboids, self.refs[ids].tolist()):
+            if ref[0] >= 0:
+                c.ref = tuple(ref)
+        return cuboids
+
+
+def tree_page_size(max_entries):
+    """能放下 max_entries 个内部条目的最小页长（2的幂，不小于 MIN_PAGE_SIZE）"""
+    page_size = MIN_PAGE_SIZE
+    while internal_capacity(page_size) < max_entries:
+        page_size *= 2
+    return page_size
+
+
+def _read_xlsx(file_path):
+    """只读模式按行流式读取表格的第1、2、4列（与 .plt 的 纬度,经度,0,海拔 列序一致），跳过不是数字的行"""
+    bk = openpyxl.load_workbook(file_path, read_only=True)
+    rows = []
+    try:
+        for row in bk.active.iter_rows(max_col=max(XLSX_COLUMNS) + 1, values_only=True):
+            try:
+                rows.append(tuple(float(row[c]) for c in XLSX_COLUMNS))
+            except (TypeError, ValueError, IndexError):
+                continue
+    finally:
+        bk.close()
+    return np.array(rows, dtype=np.float64).reshape(-1, 3)
+
+
+def _read_plt(file_path):
+    """GeoLife .plt：跳过表头，取 纬度,经度,海拔 三列"""
+    return np.loadtxt(file_path, delimiter=',', skiprows=PLT_HEADER_LINES, usecols=PLT_COLUMNS,
+                      dtype=np.float64, ndmin=2).reshape(-1, 3)
+
+
+def cache_path(file_path):
+    return file_path + CACHE_SUFFIX
+
+
 def getdata(file_path):
-    colum=[1,2,4]
-    bk = openpyxl.load_workbook(file_path)
-    sheet=bk.active
-    minrow = sheet.min_row  # 最小行
-    maxrow = sheet.max_row  # 最大行
-    global x
-    x=[]
-    global y
-    y=[]
-    global z
-    z=[]
-    for m in colum:#0,1,3
-        if(m==1):
-            for n in range(minrow, maxrow+1):
-                x.append(sheet.cell(n, m).value)
-                #print(x, end=" ")
-        if (m == 2):
-            for n in range(minrow, maxrow + 1):
-                y.append(sheet.cell(n, m).value)
-                #print(y, end=" ")
-        if (m == 4):
-            for n in range(minrow, maxrow + 1):
-                z.append(sheet.cell(n, m).value)
-                #print(z, end=" ")
-    #print(x)
+    """返回轨迹点的 x, y, z 三列数组；第一次读取时把表格/.plt 转成按列存放的 .npy 缓存，
+    之后只要源文件的大小和修改时间没变就直接以内存映射打开缓存"""
+    stat = os.stat(file_path)
+    signature = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    cache, meta = cache_path(file_path), cache_path(file_path) + ".json"
+    if os.path.exists(cache) and os.path.exists(meta):
+        with open(meta) as f:
+            if json.load(f) == signature:
+                x, y, z = np.load(cache, mmap_mode="r")
+                return x, y, z
+    points = _read_plt(file_path) if file_path.lower().endswith(".plt") else _read_xlsx(file_path)
+    np.save(cache, np.ascontiguousarray(points.T))  # 3×n，每列连续存放
+    with open(meta, "w") as f:
+        json.dump(signature, f)
+    x, y, z = np.load(cache, mmap_mode="r")
+    return x, y, z
+
+
+def segment_bounds(x, y, z):
+    """轨迹相邻两点张成的长方体，整体向量化计算，返回 (n-1)×6 的 (x1,y1,z1,x2,y2,z2)"""
+    pts = np.column_stack((x, y, z))
+    return np.hstack((np.minimum(pts[:-1], pts[1:]), np.maximum(pts[:-1], pts[1:])))
+
+
+def read_cuboids(file_path='data.xlsx'):
+    """轨迹相邻两点张成的长方体"""
+    return Cuboid.from_bounds(segment_bounds(*getdata(file_path)))
+
+
+def build_tree(file_path='data.xlsx', max_entries=4, min_entries=2):
+    """读取表格并逐条插入建树"""
+    tree = R3StarTree(max_entries=max_entries, min_entries=min_entries)
+    for c in read_cuboids(file_path):
+        tree.insert(c)
+    return tree
+
+
+def open_tree(file_path='data.xlsx', tree_path=TREE_FILE, max_entries=4, min_entries=2):
+    """索引文件比表格新且参数一致时直接加载，否则重建并保存"""
+    if os.path.exists(tree_path) and os.path.getmtime(tree_path) >= os.path.getmtime(file_path):
+        tree = R3StarTree.load(tree_path)
+        if (tree.max_entries, tree.min_entries) == (max_entries, min_entries):
+            return tree
+    tree = build_tree(file_path, max_entries, min_entries)
+    tree.save(tree_path)
+    return tree
+
+
+def _measure(fn):
+    """返回 (结果, 用时秒, 峰值内存字节)；计时与内存分两次测，避免 tracemalloc 拖慢计时"""
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    result = fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def benchmark_startup(file_path='data.xlsx', tree_path=TREE_FILE, max_entries=4, min_entries=2):
+    """比较启动方式：读表格逐条插入重建 vs 从索引文件加载，报告用时和峰值内存"""
+    for stale in (cache_path(file_path), cache_path(file_path) + ".json"):
+        if os.path.exists(stale):
+            os.remove(stale)
+    start = time.perf_counter()
+    getdata(file_path)
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    getdata(file_path)
+    print(f"读轨迹点: 首次 {cold:.3f}s（生成列缓存），命中缓存 {time.perf_counter() - start:.4f}s")
+    built, build_seconds, build_peak = _measure(lambda: build_tree(file_path, max_entries, min_entries))
+    built.save(tree_path)
+    loaded, load_seconds, load_peak = _measure(lambda: R3StarTree.load(tree_path))
+    query = built.root.mbc or Cuboid(0, 0, 0, 0, 0, 0)
+    assert len(loaded.search(query)) == len(built.search(query)) == built.size
+    print(f"{built.size} 个长方体，树高 {built.root.level + 1}，索引文件 {os.path.getsize(tree_path)} 字节")
+    print(f"重建: {build_seconds:.3f}s，峰值内存 {build_peak / 2 ** 20:.2f}MB")
+    print(f"加载: {load_seconds:.3f}s，峰值内存 {load_peak / 2 ** 20:.2f}MB，快 {build_seconds / load_seconds:.1f} 倍")
+
+
+def benchmark_insert(file_path='data.xlsx', fanouts=((4, 2), (16, 6), (50, 20))):
+    """在 data.xlsx 轨迹上测试逐条插入的吞吐量"""
+    cuboids = read_cuboids(file_path)
+    for max_entries, min_entries in fanouts:
+        tree = R3StarTree(max_entries=max_entries, min_entries=min_entries)
+        start = time.perf_counter()
+        for c in cuboids:
+            tree.insert(c)
+        elapsed = time.perf_counter() - start
+        print(f"M={max_entries} m={min_entries}: 插入 {tree.size} 个长方体用时 {elapsed:.3f}s，"
+              f"{tree.size / elapsed:.0f} 次/秒，树高 {tree.root.level + 1}")
+
 
 if __name__ == "__main__":
     file_path='data.xlsx'
-    getdata(file_path)
+    mode = "demo"  # demo: 建树并查询; bench: 插入吞吐量测试; startup: 重建与加载的启动开销对比
+    if mode == "bench":
+        benchmark_insert(file_path)
+        sys.exit()
+    if mode == "startup":
+        benchmark_startup(file_path)
+        sys.exit()
 
-    # 创建三维R*树
-    r3star_tree = R3StarTree(max_entries=4, min_entries=2)
-
-    # 插入三维长方体
-    cuboids = []
-    for i in range(len(x) - 1):
-        if i < len(x) - 1:
-            x1 = x[i]
-            x2 = x[i + 1]
-            y1 = y[i]
-            y2 = y[i + 1]
-            z1 = z[i]
-            z2 = z[i + 1]
-        cuboids.append(Cuboid(float(x1), float(y1), float(z1), float(x2), float(y2), float(z2)))
-    for c in cuboids:
-        r3star_tree.insert(c)
+    # 创建三维R*树：已保存过且表格没有更新时直接加载索引文件
+    r3star_tree = open_tree(file_path, TREE_FILE, max_entries=4, min_entries=2)
 
     # 打印树结构
     print("三维R*树结构:")
@@ -259,4 +652,9 @@ if __name__ == "__main__":
     # 查询与 [0.5, 0.5, 0.5] 到 [2.5, 2.5, 2.5] 相交的长方体
     query = Cuboid(0,0,0,1000,1000,1000)
     results = r3star_tree.search(query)
-    print(f"查询结果: {results}")
\ No newline at end of file
+    print(f"查询结果: {results}")
+
+    # 压平成数组快照后做只读查询
+    frozen = r3star_tree.freeze()
+    print(f"快照: {len(frozen.node_start)} 个节点，{frozen.bounds.shape[1]} 个条目，{frozen.nbytes} 字节，"
+          f"查询命中 {len(frozen.search_ids(query))} 个")
\ No newline at end of file
@@ -1,26 +1,48 @@
 import os
+import heapq
+import mmap
+import multiprocessing
 import struct
 import random
+import tempfile
 import time
+import numpy as np
 import pandas as pd
-from typing import List, Tuple
+from typing import Iterator, List, Tuple
 from math import ceil
 import matplotlib.pyplot as plt
 import matplotlib.ticker as ticker
 from collections import Counter
+from buffer_pool import BufferPool
+from curves import hilbert_keys, quantize
+from datafile import DATA_FILE, DataFile, cluster_data_file, drop_os_cache
+from page_format import (HEADER_STRUCT, INDEX_MAGIC, INDEX_VERSION, INTERNAL_DTYPE, LEAF_DTYPE, LEAF_FORMATS,
+                         LEAF_PAGE_DTYPES, MIN_FILL, NODE_HEADER_SIZE, NODE_HEADER_STRUCT, PAGE_BOX_SIZE, QUANT_BITS,
+                         internal_capacity, leaf_capacity)
 
 
-POINT_STRUCT = "ddd"
-POINT_SIZE = struct.calcsize(POINT_STRUCT)
-MAX_ENTRIES = 4
 MIN_ENTRIES = 2
-NODE_FOLDER = "nodes"
-BLOCK_FILES = [f"blocks/block_{i}.bin" for i in range(658)]
+
+#索引文件：第0页为超级块，节点从第1页开始按固定页长存放
+INDEX_FILE = "rstar.idx"
+PAGE_SIZE = 4096                    #与数据块同量级，扇出由页长推出
+PAGE_SIZES = (1024, 2048, 4096, 8192)   #自动调优时尝试的页长
+#叶子页格式的定义见 page_format.py
+LEAF_FORMAT = "point"
+#外存构建时排序用的点记录：Hilbert序号、坐标、数据块号、块内位置
+SORT_DTYPE = np.dtype([("key", "=u8"), ("pt", "=f8", (3,)), ("block", "=i4"), ("index", "=i4")])
 
 
 NUM_QUERIES = 100
+WORKERS = 4             #并行查询的进程数
 PRECISION = 1e-3
-os.makedirs(NODE_FOLDER, exist_ok=True)
+BUFFER_PAGES = 1024     #缓冲池容量（页）
+PIN_LEVELS = 2          #常驻缓冲池的上层层数
+GEO_SCALE = (85000.0, 111000.0, 0.3048)    #北京附近经度/纬度每度约合米数，海拔英尺换算为米
+PACKING = "str"         #批量装载策略：sort / str / hilbert
+LAYOUTS = ("file", "hilbert", "zorder")    #数据块布局对比时的候选：轨迹文件顺序 / 沿曲线聚簇
+MEMORY_BUDGET = 256 * 1024 * 1024  #外存构建的内存预算（字节）
+GROW_PAGES = 64         #可写打开时索引文件每次扩展的页数
 
 #初始化生成立方体
 class MBR:
@@ -44,6 +66,21 @@ class MBR:
     def to_tuple(self):
         return (self.minx, self.miny, self.minz, self.maxx, self.maxy, self.maxz)
 
+    def volume(self):
+        return (self.maxx - self.minx) * (self.maxy - self.miny) * (self.maxz - self.minz)
+
+    def overlap(self, other):
+        dx = min(self.maxx, other.maxx) - max(self.minx, other.minx)
+        dy = min(self.maxy, other.maxy) - max(self.miny, other.miny)
+        dz = min(self.maxz, other.maxz) - max(self.minz, other.minz)
+        if dx <= 0 or dy <= 0 or dz <= 0:
+            return 0.0
+        return dx * dy * dz
+
+    def center(self, axis: int):
+        m = self.to_tuple()
+        return (m[axis] + m[axis + 3]) / 2
+
 class LeafEntry:
     def __init__(self, mbr: MBR, block_id: int, index_in_block: int):
         self.mbr = mbr                 #当前条目的最小立方体
@@ -51,52 +88,308 @@ class LeafEntry:
         self.index = index_in_block     #块内位置
 
 class InternalEntry:
-    def __init__(self, mbr: MBR, child_page: int):
+    def __init__(self, mbr: MBR, child_page: int, count: int = 0, sums=(0.0, 0.0, 0.0)):
         self.mbr = mbr
         self.child = child_page         #孩子的节点号
+        self.count = count              #子树中的点数
+        self.sums = sums                #子树中各轴坐标之和
 
-def group_entries(items: List, max_per_group: int = MAX_ENTRIES) -> List[List]:
-    n = len(items)
+#n 个条目均分成若干组时每组的大小
+def group_sizes(n: int, max_per_group: int) -> List[int]:
     if n == 0:                  #判空
         return []
     if n <= max_per_group:      #判非满
-        return [items]
+        return [n]
     # 判满
     G = ceil(n / max_per_group)
     max_groups = max(1, n // MIN_ENTRIES)
     G = min(G, max_groups)
     base = n // G
     extra = n % G
+    return [base + (1 if i < extra else 0) for i in range(G)]
+
+def group_entries(items: List, max_per_group: int) -> List[List]:
     groups = []
     idx = 0
-    for i in range(G):
-        size = base + (1 if i < extra else 0)
+    for size in group_sizes(len(items), max_per_group):
         groups.append(items[idx:idx + size])
         idx += size
     return groups
 
+#Sort-Tile-Recursive：按x切成若干片，片内按y切条，条内按z排序后分组
+def str_pack(entries: List, max_per_group: int, axis: int = 0) -> List[List]:
+    entries.sort(key=lambda e: e.mbr.center(axis))
+    if axis == 2 or len(entries) <= max_per_group:
+        return group_entries(entries, max_per_group)
+    pages = ceil(len(entries) / max_per_group)
+    slabs = ceil(pages ** (1 / (3 - axis)))
+    per_slab = max_per_group * ceil(pages / slabs)
+    groups = []
+    for i in range(0, len(entries), per_slab):
+        groups.extend(str_pack(entries[i:i + per_slab], max_per_group, axis + 1))
+    return groups
+
+#按条目中心点的Hilbert序排序后分组
+def hilbert_pack(entries: List, max_per_group: int) -> List[List]:
+    centers = np.array([[e.mbr.center(a) for a in range(3)] for e in entries])
+    keys = hilbert_keys(quantize(centers, centers.min(axis=0), centers.max(axis=0)))
+    entries[:] = [entries[i] for i in np.argsort(keys, kind="stable")]
+    return group_entries(entries, max_per_group)
+
+def pack_entries(entries: List, max_per_group: int, packing: str = PACKING) -> List[List]:
+    if packing == "str":
+        return str_pack(entries, max_per_group)
+    if packing == "hilbert":
+        return hilbert_pack(entries, max_per_group)
+    if packing == "sort":#按(minx, miny, minz)字典序排序
+        entries.sort(key=lambda e: (e.mbr.minx, e.mbr.miny, e.mbr.minz))
+        return group_entries(entries, max_per_group)
+    raise ValueError(f"未知的装载策略: {packing}")
+
+#一层节点的质量：总体积、两两重叠体积（按x扫描）和死空间（节点体积减去孩子体积之和）
+def level_quality(level: int, nodes: List[Tuple[MBR, List]]) -> dict:
+    volume = dead_space = overlap = 0.0
+    for mbr, children in nodes:
+        v = mbr.volume()
+        volume += v
+        dead_space += max(0.0, v - sum(c.mbr.volume() for c in children))
+    mbrs = sorted((mbr for mbr, _ in nodes), key=lambda m: m.minx)
+    for i, a in enumerate(mbrs):
+        for b in mbrs[i + 1:]:
+            if b.minx > a.maxx:
+                break
+            overlap += a.overlap(b)
+    return {"层": level, "节点数": len(nodes), "总体积": volume, "重叠体积": overlap, "死空间": dead_space}
+
+#流式逐层打包：本层条目总数已知，按 group_sizes 攒满一组就写一页，并把 (MBR, 页号) 交给上一层
+class LevelPacker:
+    def __init__(self, tree: "RStarTreeDisk", is_leaf: bool, total: int):
+        self.tree = tree
+        self.is_leaf = is_leaf
+        self.sizes = group_sizes(total, tree.leaf_fanout if is_leaf else tree.internal_fanout)
+        self.pages = 0
+        self.buffer = []
+        self.buffered = 0
+        self.parent = LevelPacker(tree, False, len(self.sizes)) if len(self.sizes) > 1 else None
+
+    def add(self, records: np.ndarray):
+        while len(records):
+            need = self.sizes[self.pages] - self.buffered
+            self.buffer.append(records[:need])
+            self.buffered += len(records[:need])
+            records = records[need:]
+            if self.buffered == self.sizes[self.pages]:
+                self._flush()
+
+    def _flush(self):
+        records = np.concatenate(self.buffer)
+        self.buffer, self.buffered = [], 0
+        page = self.tree._write_page(self.is_leaf, records)
+        self.pages += 1
+        if self.parent is None:#本层只有一页，即根节点
+            self.tree.root_page = page
+            return
+        entry = np.zeros(1, INTERNAL_DTYPE)
+        entry["mbr"][0, :3] = records["mbr"][:, :3].min(axis=0)
+        entry["mbr"][0, 3:] = records["mbr"][:, 3:].max(axis=0)
+        entry["child"] = page
+        entry["count"], entry["sum"] = records_aggregate(self.is_leaf, records)
+        self.parent.add(entry)
+
+#把数据块中的点按内存预算切段，段内按Hilbert序号排序后写成临时文件
+def write_sorted_runs(data: DataFile, lo, hi, run_len: int, tmp_dir: str) -> List[str]:
+    runs, buffer, buffered = [], [], 0
+
+    def flush():
+        run = np.concatenate(buffer)
+        run = run[np.argsort(run["key"], kind="stable")]
+        path = os.path.join(tmp_dir, f"run_{len(runs)}.npy")
+        np.save(path, run)
+        runs.append(path)
+
+    for block_id in range(len(data)):
+        pts = data.block_points(block_id)
+        recs = np.zeros(len(pts), SORT_DTYPE)
+        recs["key"] = hilbert_keys(quantize(pts, lo, hi))
+        recs["pt"] = pts
+        recs["block"] = block_id
+        recs["index"] = np.arange(len(pts))
+        buffer.append(recs)
+        buffered += len(recs)
+        if buffered >= run_len:
+            flush()
+            buffer, buffered = [], 0
+    if buffer:
+        flush()
+    return runs
+
+#多路归并：每轮从各段读入一小块，取各块末尾键的最小值为界，界内记录都可安全输出
+def merge_runs(run_paths: List[str], memory_budget: int = MEMORY_BUDGET) -> Iterator[np.ndarray]:
+    runs = [np.load(p, mmap_mode="r") for p in run_paths]
+    chunk = max(1, memory_budget // (SORT_DTYPE.itemsize * 3 * max(1, len(runs))))
+    pos = [0] * len(runs)
+    while True:
+        bufs = [(i, run[pos[i]:pos[i] + chunk]) for i, run in enumerate(runs) if pos[i] < len(run)]
+        if not bufs:
+            return
+        bound = min(buf["key"][-1] for _, buf in bufs)
+        out = []
+        for i, buf in bufs:
+            n = int(np.searchsorted(buf["key"], bound, side="right"))
+            out.append(np.array(buf[:n]))
+            pos[i] += n
+        merged = np.concatenate(out)
+        yield merged[np.argsort(merged["key"], kind="stable")]
+
 class RStarTreeDisk:
-    def __init__(self):
-        self.next_page_id = 0
+    def __init__(self, index_path: str = INDEX_FILE, page_size: int = PAGE_SIZE, data_path: str = DATA_FILE,
+                 writable: bool = False, leaf_format: str = LEAF_FORMAT):
+        self.index_path = index_path
+        self.page_size = page_size
+        self.leaf_format = leaf_format
+        self.leaf_code = LEAF_FORMATS[leaf_format]
+        self.exact_leaves = self.leaf_code not in QUANT_BITS   #叶子条目是否就是精确坐标
+        self.leaf_fanout = leaf_capacity(page_size, self.leaf_code)
+        self.internal_fanout = internal_capacity(page_size)
+        self.next_page_id = 1           #第0页留给超级块
         self.root_page = None
+        self.free_head = 0              #空闲页链表头，0表示没有空闲页
+        self._height = None
+        self._file = None
+        self._mm = None
+        self.buffer_pool = None
+        self.pin_levels = 0
+        self.level_stats = []           #构建时每层的重叠与死空间，0为叶子层
+        self.hooks = []                 #查询探针（见 index_stats.QueryHook），为空时遍历不做额外工作
+        self.blocks = DataFile(data_path, writable)     #数据块所在的数据文件
+        if min(self.leaf_fanout, self.internal_fanout) < 2 * MIN_ENTRIES:
+            raise ValueError(f"页长 {page_size} 太小，每页至少要放 {2 * MIN_ENTRIES} 个条目")
+
+    #打开已建好的索引文件，节点通过mmap按偏移读取；writable 为真时可以增量插入和删除
+    @classmethod
+    def open(cls, index_path: str = INDEX_FILE, data_path: str = DATA_FILE,
+             writable: bool = False) -> "RStarTreeDisk":
+        with open(index_path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, page_size, leaf_fanout, internal_fanout, root_page, page_count, free_head, leaf_code = \
+            struct.unpack_from(HEADER_STRUCT, mm, 0)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            mm.close()
+            raise ValueError(f"{index_path} 不是有效的索引文件（版本 {version}，需要 {INDEX_VERSION}，请重建）")
+        if leaf_code not in LEAF_FORMATS.values():#如内存R*树保存的线段长方体文件
+            mm.close()
+            raise ValueError(f"{index_path} 的叶子页格式 {leaf_code} 不是点索引，不能按点索引打开")
+        leaf_format = next(name for name, code in LEAF_FORMATS.items() if code == leaf_code)
+        tree = cls(index_path, page_size, data_path, writable, leaf_format)
+        tree.leaf_fanout, tree.internal_fanout = leaf_fanout, internal_fanout
+        tree.root_page = root_page
+        tree.next_page_id = page_count
+        tree.free_head = free_head
+        tree._mm = mm
+        if writable:
+            tree._file = open(index_path, "r+b")
+            tree._height = tree.height
+        return tree
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self.blocks.close()
 
-    def build_from_blocks(self, block_files: List[str]):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    #丢弃索引文件和数据文件在操作系统中的页缓存，用于冷启动测量
+    def drop_os_cache(self) -> bool:
+        return drop_os_cache(self.index_path, self._mm) & self.blocks.drop_os_cache()
+
+    @property
+    def page_count(self) -> int:
+        return self.next_page_id
+
+    #树高：沿最左路径走到叶子
+    @property
+    def height(self) -> int:
+        page_id, levels = self.root_page, 1
+        while True:
+            is_leaf, entries = self.read_node(page_id)
+            if is_leaf:
+                return levels
+            page_id, levels = int(entries["child"][0]), levels + 1
+
+    def build_from_blocks(self, packing: str = PACKING):
         leaf_entries = []
-        #读取分块文件
-        for block_id, file_path in enumerate(block_files):
-            with open(file_path, "rb") as f:
-                data = f.read()
-            num_points = len(data)
-            for i in range(num_points):
-                lon, lat, alt = struct.unpack(POINT_STRUCT, data[i * POINT_SIZE:(i + 1) * POINT_SIZE])#按照经纬海拔读取数据
+        #逐块读取数据文件
+        for block_id in range(len(self.blocks)):
+            for i, (lon, lat, alt) in enumerate(self.blocks.block_points(block_id).tolist()):#按照经纬海拔读取数据
                 mbr = MBR(lon, lat, alt, lon, lat, alt)#将每个点的坐标都作为立方体的上下界
                 leaf_entries.append(LeafEntry(mbr, block_id, i))
-        leaf_entries.sort(key=lambda e: (e.mbr.minx, e.mbr.miny, e.mbr.minz)) #相近的立方体划为一组
-        leaf_pages = []
-        for group in group_entries(leaf_entries):
-            page = self._write_node(True, group)
-            leaf_pages.append((self._compute_mbr(group), page))#将点扩展立方体
-        self._build_internal(leaf_pages)
+        self.level_stats = []
+        with open(self.index_path, "wb") as f:
+            self._file = f
+            f.write(bytes(self.page_size))#先占住超级块
+            leaf_pages = self._pack_level(True, leaf_entries, packing)#相近的点划为一组
+            self._build_internal(leaf_pages, packing)
+            self._write_header()
+        self._file = None
+
+    #按装载策略把一层条目分组写成节点，返回上一层需要的 (MBR, 页号, 点数, 坐标和)
+    def _pack_level(self, is_leaf: bool, entries: List, packing: str) -> List[Tuple]:
+        nodes = []
+        fanout = self.leaf_fanout if is_leaf else self.internal_fanout
+        for group in pack_entries(entries, fanout, packing):
+            records = self._node_records(is_leaf, group)
+            page = self._write_page(is_leaf, records)
+            nodes.append((self._compute_mbr(group), page, group, records_aggregate(is_leaf, records)))
+        self.level_stats.append(level_quality(len(self.level_stats), [(mbr, group) for mbr, _, group, _ in nodes]))
+        return [(mbr, page, *agg) for mbr, page, _, agg in nodes]
+
+    #外存构建：流式读取数据块生成按Hilbert序排好的段文件，多路归并后逐层流式打包，内存占用受 memory_budget 限制
+    def build_external(self, memory_budget: int = MEMORY_BUDGET, tmp_dir: str = None) -> dict:
+        start = time.perf_counter()
+        #第一遍：统计点数和坐标范围，用于量化Hilbert序号和预先确定每层的分组
+        lo, hi, total = np.full(3, np.inf), np.full(3, -np.inf), 0
+        for block_id in range(len(self.blocks)):
+            pts = self.blocks.block_points(block_id)
+            if len(pts):
+                lo, hi = np.minimum(lo, pts.min(axis=0)), np.maximum(hi, pts.max(axis=0))
+                total += len(pts)
+        if total == 0:
+            raise ValueError("数据块中没有数据点")
+        run_len = max(1, memory_budget // (SORT_DTYPE.itemsize * 3))#排序时约有三份拷贝
+        self.level_stats = []
+        with tempfile.TemporaryDirectory(dir=tmp_dir) as tmp:
+            runs = write_sorted_runs(self.blocks, lo, hi, run_len, tmp)
+            with open(self.index_path, "wb") as f:
+                self._file = f
+                f.write(bytes(self.page_size))#先占住超级块
+                leaves = LevelPacker(self, True, total)
+                for chunk in merge_runs(runs, memory_budget):
+                    records = np.zeros(len(chunk), LEAF_DTYPE)
+                    records["mbr"][:, :3] = chunk["pt"]
+                    records["mbr"][:, 3:] = chunk["pt"]
+                    records["block"], records["index"] = chunk["block"], chunk["index"]
+                    leaves.add(records)
+                self._write_header()
+            self._file = None
+        level = leaves
+        while level is not None:
+            self.level_stats.append({"层": len(self.level_stats), "节点数": level.pages})
+            level = level.parent
+        try:
+            import resource
+            peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        except ImportError:#resource 只在Unix上有，Windows上不报告
+            peak_rss = None
+        return {"点数": total, "排序段数": len(runs), "页数": self.page_count - 1,
+                "耗时": time.perf_counter() - start, "峰值RSS(MB)": peak_rss}
 
     #生成节点立方体
     def _compute_mbr(self, entries: List) -> MBR:
@@ -106,122 +399,855 @@ class RStarTreeDisk:
         return mbr
 
     #构建R*树
-    def _build_internal(self, nodes: List[Tuple[MBR, int]]):
+    def _build_internal(self, nodes: List[Tuple], packing: str = PACKING):
         while len(nodes) > 1:
-            nodes.sort(key=lambda x: (x[0].minx, x[0].miny, x[0].minz))
-            next_level = []
-            for group in group_entries(nodes):
-                entries = [InternalEntry(mbr, pid) for mbr, pid in group]
-                page = self._write_node(False, entries)
-                next_level.append((self._compute_mbr(entries), page))
-            nodes = next_level
+            entries = [InternalEntry(mbr, pid, count, sums) for mbr, pid, count, sums in nodes]
+            nodes = self._pack_level(False, entries, packing)
         self.root_page = nodes[0][1]
 
-    #索引写入文件
-    def _write_node(self, is_leaf: bool, entries: List):
+    #超级块：记录页长、扇出、根页号和总页数
+    def _write_header(self):
+        header = struct.pack(HEADER_STRUCT, INDEX_MAGIC, INDEX_VERSION, self.page_size, self.leaf_fanout,
+                             self.internal_fanout, self.root_page, self.next_page_id, self.free_head, self.leaf_code)
+        self._file.seek(0)
+        self._file.write(header.ljust(self.page_size, b"\0"))
+
+    #条目对象转成一页的记录数组
+    def _node_records(self, is_leaf: bool, entries: List) -> np.ndarray:
+        records = np.zeros(len(entries), LEAF_DTYPE if is_leaf else INTERNAL_DTYPE)
+        records["mbr"] = [entry.mbr.to_tuple() for entry in entries]
+        if is_leaf:
+            records["block"] = [entry.block_id for entry in entries]
+            records["index"] = [entry.index for entry in entries]
+        else:
+            records["child"] = [entry.child for entry in entries]
+            records["count"] = [entry.count for entry in entries]
+            records["sum"] = [entry.sums for entry in entries]
+        return records
+
+    #分配一页写入节点，返回页号
+    def _write_page(self, is_leaf: bool, records: np.ndarray) -> int:
+        page_id = self._allocate_page()
+        self._store_page(page_id, is_leaf, records)
+        return page_id
+
+    #优先复用空闲页
+    def _allocate_page(self) -> int:
+        if self.free_head:
+            page_id = self.free_head
+            self.free_head = struct.unpack_from("=i", self._mm, page_id * self.page_size + NODE_HEADER_SIZE)[0]
+            return page_id
         page_id = self.next_page_id
         self.next_page_id += 1
-        path = os.path.join(NODE_FOLDER, f"node_{page_id}.bin")
-        #按照设计的索引结构把索引写入文件
-        with open(path, "wb") as f:
-            f.write(struct.pack("i", page_id))
-            f.write(struct.pack("?", is_leaf))
-            f.write(struct.pack("i", len(entries)))
-            for entry in entries:
-                f.write(struct.pack("6d", *entry.mbr.to_tuple()))
+        return page_id
+
+    #按照设计的索引结构把一页条目记录写入定长页，叶子按本树的叶子页格式编码
+    def _store_page(self, page_id: int, is_leaf: bool, records: np.ndarray):
+        page = bytearray(self.page_size)
+        code = self.leaf_code if is_leaf else 0
+        struct.pack_into(NODE_HEADER_STRUCT, page, 0, page_id, is_leaf, code, len(records))
+        if is_leaf and code:
+            data = encode_leaf(self._exact_records(records), code)
+        else:
+            data = records.tobytes()
+        page[NODE_HEADER_SIZE:NODE_HEADER_SIZE + len(data)] = data
+        self._put_page(page_id, page)
+
+    #量化格式读回的条目只是格点小盒，改写页之前从数据块取回精确坐标
+    def _exact_records(self, records: np.ndarray) -> np.ndarray:
+        mbrs = records["mbr"]
+        loose = np.flatnonzero(np.any(mbrs[:, :3] != mbrs[:, 3:], axis=1))
+        if not len(loose):
+            return records
+        records = records.copy()
+        for i in loose.tolist():
+            pt = self.blocks.block_points(int(records["block"][i]))[int(records["index"][i])]
+            records["mbr"][i] = np.concatenate([pt, pt])
+        return records
+
+    #释放的页挂到空闲链表头
+    def _free_page(self, page_id: int):
+        page = bytearray(self.page_size)
+        struct.pack_into(NODE_HEADER_STRUCT + "i", page, 0, page_id, False, 0, -1, self.free_head)
+        self._put_page(page_id, page, freed=True)
+        self.free_head = page_id
+
+    def _put_page(self, page_id: int, page: bytearray, freed: bool = False):
+        offset = page_id * self.page_size
+        self._file.seek(offset)
+        self._file.write(page)
+        if self._mm is None:#批量构建时只写不读
+            return
+        self._file.flush()
+        if offset + self.page_size > len(self._mm):#文件变长后重新映射，一次多扩展几页
+            self._file.truncate(offset + self.page_size * GROW_PAGES)
+            self._mm.close()
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.buffer_pool is None:
+            return
+        if freed:#空闲页不是节点，不能重新读入
+            self.buffer_pool.discard(page_id)
+        else:
+            self.buffer_pool.invalidate(page_id)
+
+    #挂上/摘下查询探针：读页、访问节点、读数据块时回调
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+        return hook
+
+    def remove_hook(self, hook):
+        self.hooks.remove(hook)
+
+    #按页号读取节点，返回是否叶子和条目结构体数组（mbr 为 n×6 列，叶子另有 block/index，内部节点有 child）
+    def read_node(self, page_id: int) -> Tuple[bool, np.ndarray]:
+        if self.hooks:
+            return self._read_node_timed(page_id)
+        base = page_id * self.page_size
+        _, is_leaf, code, count = struct.unpack_from(NODE_HEADER_STRUCT, self._mm, base)
+        if count < 0:
+            raise ValueError(f"第 {page_id} 页是空闲页，不是节点")
+        if is_leaf:
+            return True, decode_leaf(self._mm, base + NODE_HEADER_SIZE, count, code)
+        #拷贝出页内容，缓存中的节点不引用mmap
+        return False, np.frombuffer(self._mm, INTERNAL_DTYPE, count, base + NODE_HEADER_SIZE).copy()
+
+    #有探针时把读页拆成两段计时：从mmap拷出整页（缺页时即物理IO）和解码成条目
+    def _read_node_timed(self, page_id: int) -> Tuple[bool, np.ndarray]:
+        start = time.perf_counter()
+        page = self._mm[page_id * self.page_size:(page_id + 1) * self.page_size]
+        loaded = time.perf_counter()
+        _, is_leaf, code, count = struct.unpack_from(NODE_HEADER_STRUCT, page, 0)
+        if count < 0:
+            raise ValueError(f"第 {page_id} 页是空闲页，不是节点")
+        if is_leaf:
+            node = True, decode_leaf(page, NODE_HEADER_SIZE, count, code)
+        else:
+            node = False, np.frombuffer(page, INTERNAL_DTYPE, count, NODE_HEADER_SIZE).copy()
+        done = time.perf_counter()
+        for hook in self.hooks:
+            hook.on_page_read(page_id, loaded - start, done - loaded)
+        return node
+
+    #在节点读取前加一层缓冲池，可钉住从根开始的若干层
+    def enable_buffer_pool(self, capacity_pages: int = BUFFER_PAGES, capacity_bytes: int = None,
+                           policy="lru", pin_levels: int = 0) -> BufferPool:
+        self.buffer_pool = BufferPool(self.read_node, capacity_pages, capacity_bytes, self.page_size, policy)
+        self.pin_levels = pin_levels
+        level = [self.root_page]
+        for _ in range(pin_levels):
+            next_level = []
+            for page_id in level:
+                self.buffer_pool.pin(page_id)
+                is_leaf, entries = self.buffer_pool.get(page_id)
+                if not is_leaf:
+                    next_level.extend(entries["child"].tolist())
+            level = next_level
+        return self.buffer_pool
+
+    #逻辑读：有缓冲池时先查缓存
+    def get_node(self, page_id: int) -> Tuple[bool, np.ndarray]:
+        if self.buffer_pool is None:
+            return self.read_node(page_id)
+        return self.buffer_pool.get(page_id)
+
+    #显式栈遍历，每到一个叶子产出其中与查询相交条目的 (块号数组, 块内位置数组)
+    def iter_leaf_candidates(self, page_id: int, query: MBR, node_io: Counter) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        hooks = self.hooks
+        for hook in hooks:
+            hook.on_query(query)
+        stack = [(page_id, 0)]     #(页号, 距根的深度)
+        while stack:
+            page_id, depth = stack.pop()
+            if not 0 < page_id < self.page_count:
+                continue
+            node_io[page_id] += 1#统计节点访问次数（逻辑读）
+            is_leaf, entries = self.get_node(page_id)
+            mask = intersect_mask(entries["mbr"], query)#判重叠
+            for hook in hooks:
+                hook.on_node(page_id, depth, is_leaf, len(entries), int(np.count_nonzero(mask)))
+            if is_leaf:
+                if mask.any():
+                    yield entries["block"][mask], entries["index"][mask]
+            else:
+                stack.extend((child, depth + 1) for child in reversed(entries["child"][mask].tolist()))#保持从左到右的访问顺序
+
+    #流式范围查询：逐个产出命中点，limit 给定时取够即停止遍历
+    def range_query(self, query: MBR, limit: int = None, node_io: Counter = None,
+                    block_io: Counter = None) -> Iterator[Tuple]:
+        node_io = Counter() if node_io is None else node_io
+        block_io = Counter() if block_io is None else block_io
+        emitted = 0
+        for candidate in self.iter_leaf_candidates(self.root_page, query, node_io):
+            for pts in iter_block_hits(self.blocks, [candidate], query, block_io, self.hooks):
+                for pt in map(tuple, pts.tolist()):
+                    yield pt
+                    emitted += 1
+                    if limit is not None and emitted >= limit:
+                        return
+
+    #只计数：用内部条目上的子树点数，只读查询边界上的页
+    def range_count(self, query: MBR, node_io: Counter = None, block_io: Counter = None) -> int:
+        return self.aggregate_query(query, node_io, block_io)["点数"]
+
+    #聚合查询：孩子MBR整个落在查询框内时直接累加该条目的点数、坐标和，最值取其MBR，不再下探；
+    #只有跨查询边界的子树才往下读。叶子条目是精确坐标时不读数据块，量化格式的边界叶子回数据块精确判断
+    def aggregate_query(self, query: MBR, node_io: Counter = None, block_io: Counter = None) -> dict:
+        node_io = Counter() if node_io is None else node_io
+        block_io = Counter() if block_io is None else block_io
+        count, sums = 0, np.zeros(3)
+        lo, hi = np.full(3, np.inf), np.full(3, -np.inf)
+        candidates = []
+        hooks = self.hooks
+        for hook in hooks:
+            hook.on_query(query)
+        stack = [(self.root_page, 0)]     #(页号, 距根的深度)
+        while stack:
+            page_id, depth = stack.pop()
+            if not 0 < page_id < self.page_count:
+                continue
+            node_io[page_id] += 1
+            is_leaf, entries = self.get_node(page_id)
+            mbrs = entries["mbr"]
+            hit = intersect_mask(mbrs, query)
+            for hook in hooks:
+                hook.on_node(page_id, depth, is_leaf, len(entries), int(np.count_nonzero(hit)))
+            if is_leaf and not self.exact_leaves:
+                if hit.any():
+                    candidates.append((entries["block"][hit], entries["index"][hit]))
+                continue
+            inside = hit & contain_mask(mbrs, query)
+            if inside.any():
                 if is_leaf:
-                    f.write(struct.pack("ii", entry.block_id, entry.index))
+                    count += int(np.count_nonzero(inside))
+                    sums += mbrs[inside, :3].sum(axis=0)
                 else:
-                    f.write(struct.pack("i", entry.child))
-        return page_id
+                    count += int(entries["count"][inside].sum())
+                    sums += entries["sum"][inside].sum(axis=0)
+                lo = np.minimum(lo, mbrs[inside, :3].min(axis=0))
+                hi = np.maximum(hi, mbrs[inside, 3:].max(axis=0))
+            if not is_leaf:
+                stack.extend((child, depth + 1) for child in entries["child"][hit & ~inside].tolist())
+        for pts in iter_block_hits(self.blocks, candidates, query, block_io, hooks):
+            if len(pts):
+                count += len(pts)
+                sums += pts.sum(axis=0)
+                lo, hi = np.minimum(lo, pts.min(axis=0)), np.maximum(hi, pts.max(axis=0))
+        if not count:
+            lo = hi = np.full(3, np.nan)
+        return {"点数": count, "总和": sums, "最小": lo, "最大": hi, "均值": sums / count if count else np.full(3, np.nan)}
 
-#读取节点中的立方体范围
-def get_tree_mbr(root_page_id: int) -> MBR:
-    path = os.path.join(NODE_FOLDER, f"node_{root_page_id}.bin")
-    with open(path, "rb") as f:
-        f.read(4)
-        is_leaf = struct.unpack("?", f.read(1))[0]
-        count = struct.unpack("i", f.read(4))[0]
-        bounds = [None] * 6
-        for _ in range(count):
-            m = struct.unpack("6d", f.read(48))
-            bounds = [m[i] if bounds[i] is None else min(bounds[i], m[i]) if i < 3 else max(bounds[i], m[i]) for i in range(6)]
-            f.read(8 if is_leaf else 4)
-        return MBR(*bounds)#返回最大查询范围
-
-
-#生成查询立方体
-def generate_query_mbr(root_mbr: MBR, scale: float) -> MBR:
-    # dx = (root_mbr.maxx - root_mbr.minx) * scale ** (1/3)
-    # dy = (root_mbr.maxy - root_mbr.miny) * scale ** (1/3)
-    # dz = (root_mbr.maxz - root_mbr.minz) * scale ** (1/3)
-    # cx = random.uniform(root_mbr.minx + dx/2, root_mbr.maxx - dx/2)
-    # cy = random.uniform(root_mbr.miny + dy/2, root_mbr.maxy - dy/2)
-    # cz = random.uniform(root_mbr.minz + dz/2, root_mbr.maxz - dz/2)
-    dx = (root_mbr.maxx - root_mbr.minx) * scale ** (1/3)
-    dy = (root_mbr.maxy - root_mbr.miny) * scale ** (1/3)
-    dz = (400 - (50)) * scale ** (1/3)
-    cx = random.uniform(root_mbr.minx + dx/2, root_mbr.maxx - dx/2)
-    cy = random.uniform(root_mbr.miny + dy/2, root_mbr.maxy - dy/2)
-    cz = random.uniform(50 + dz/2, 400 - dz/2)
-    return MBR(cx - dx/2, cy - dy/2, cz - dz/2, cx + dx/2, cy + dy/2, cz + dz/2)
-
-#按照索引查询
-def query_rstar_tree(page_id: int, query: MBR, node_io: Counter, block_io: Counter, hits: List[Tuple]):
-    path = os.path.join(NODE_FOLDER, f"node_{page_id}.bin")
-    if not os.path.exists(path):
-        return
-    node_io[page_id] += 1#统计IO次数
-    with open(path, "rb") as f:
-        f.read(4)
-        is_leaf = struct.unpack("?", f.read(1))[0]
-        count = struct.unpack("i", f.read(4))[0]
-        for _ in range(count):
-            mbr_vals = struct.unpack("6d", f.read(48))#读取节点所有条目
-            mbr = MBR(*mbr_vals)
-            if not mbr.intersects(query):#判无重叠
-                f.read(8 if is_leaf else 4)
+    #最佳优先k近邻：优先队列按各条目MBR到查询点的最小距离(MINDIST)排序，scale 为各轴距离的缩放系数
+    def knn_query(self, point: Tuple[float, float, float], k: int, scale=(1.0, 1.0, 1.0),
+                  node_io: Counter = None, block_io: Counter = None) -> List[Tuple[float, Tuple]]:
+        node_io = Counter() if node_io is None else node_io
+        block_io = Counter() if block_io is None else block_io
+        p = np.asarray(point, dtype=float)
+        w = np.asarray(scale, dtype=float)
+        hooks = self.hooks
+        for hook in hooks:#探针收到查询点的退化MBR
+            hook.on_query(MBR(*point, *point))
+        heap = [(0.0, 0, self.root_page, 0, None)]     #(距离, 序号, 页号或-1, 深度, (块号, 块内位置, 精确坐标))
+        seq = 1
+        result = []
+        while heap and len(result) < k:
+            dist, _, page_id, depth, ref = heapq.heappop(heap)
+            if ref is not None:#弹出的是数据点条目，它已是剩余中最近的
+                block_id, idx, pt = ref
+                if pt is None:
+                    if block_id not in block_io:
+                        block_io[block_id] += 1
+                    pt = tuple(self.blocks.block_points(block_id)[idx].tolist())
+                    if not self.exact_leaves:#格点小盒的MINDIST只是下界，按精确距离重新入队
+                        heapq.heappush(heap, (float(mindist(np.array([pt * 2]), p, w)[0]), seq, -1, depth, (block_id, idx, pt)))
+                        seq += 1
+                        continue
+                result.append((dist, pt))
+                continue
+            if not 0 < page_id < self.page_count:
                 continue
-            if is_leaf:#判叶子节点，打开数据块，读取数据点
-                block_id, idx = struct.unpack("ii", f.read(8))
-                if 0 <= block_id < len(BLOCK_FILES):
-                    block_io[block_id] += 1#统计I/o次数
-                    with open(BLOCK_FILES[block_id], "rb") as b:
-                        b.seek(idx * POINT_SIZE)
-                        pt = struct.unpack(POINT_STRUCT, b.read(POINT_SIZE))
-                        if all([query.minx <= pt[0] <= query.maxx,
-                                query.miny <= pt[1] <= query.maxy,
-                                query.minz <= pt[2] <= query.maxz]):
-                            hits.append(pt)
+            node_io[page_id] += 1
+            is_leaf, entries = self.get_node(page_id)
+            dists = mindist(entries["mbr"], p, w).tolist()
+            for hook in hooks:#全部条目都进队列，剪枝体现为没被弹出访问的节点
+                hook.on_node(page_id, depth, is_leaf, len(entries), len(entries))
+            if is_leaf:#精确格式的叶子条目本身就是点坐标，不用回数据块
+                pts = map(tuple, entries["mbr"][:, :3].tolist()) if self.exact_leaves else [None] * len(entries)
+                for d, block_id, idx, pt in zip(dists, entries["block"].tolist(), entries["index"].tolist(), pts):
+                    heapq.heappush(heap, (d, seq, -1, depth + 1, (block_id, idx, pt)))
+                    seq += 1
             else:
-                child_id = struct.unpack("i", f.read(4))[0]
-                query_rstar_tree(child_id, query, node_io, block_io, hits)#递归寻找
+                for d, child in zip(dists, entries["child"].tolist()):
+                    heapq.heappush(heap, (d, seq, child, depth + 1, None))
+                    seq += 1
+        return result
+
+    #节点最小填充数
+    def _min_fill(self, is_leaf: bool) -> int:
+        return max(MIN_ENTRIES, int((self.leaf_fanout if is_leaf else self.internal_fanout) * MIN_FILL))
+
+    #增量插入一个数据点，只改写从根到叶子路径上的页
+    def insert_point(self, point: Tuple[float, float, float], block_id: int, index: int):
+        record = np.zeros(1, LEAF_DTYPE)
+        record["mbr"] = tuple(point) * 2
+        record["block"], record["index"] = block_id, index
+        self._insert_records(record, 0)
+        self._write_header()
+
+    #把条目插入第 level 层的节点（叶子为0层），溢出时R*分裂并向上传递
+    def _insert_records(self, record: np.ndarray, level: int):
+        path = []
+        page_id = self.root_page
+        while True:
+            is_leaf, entries = self.get_node(page_id)
+            node_level = self._height - 1 - len(path)
+            if node_level == level:
+                path.append((page_id, is_leaf, entries, None))
+                break
+            idx = choose_subtree(entries["mbr"], record["mbr"][0], node_level == 1)
+            path.append((page_id, is_leaf, entries, idx))
+            page_id = int(entries["child"][idx])
+        carry = None    #下层分裂出的新兄弟节点条目
+        child_mbr = child_agg = None
+        #子树点数沿路径都会变，路径上的页全部改写
+        for page_id, is_leaf, entries, idx in reversed(path):
+            if idx is None:
+                entries = np.concatenate([entries, record])
+            else:
+                entries = entries.copy()
+                entries["mbr"][idx] = child_mbr
+                entries["count"][idx], entries["sum"][idx] = child_agg
+                if carry is not None:
+                    entries = np.concatenate([entries, carry])
+            if is_leaf:
+                entries = self._exact_records(entries)
+            if len(entries) > (self.leaf_fanout if is_leaf else self.internal_fanout):
+                first, second = split_records(entries, self._min_fill(is_leaf))
+                self._store_page(page_id, is_leaf, first)
+                carry = internal_record(record_bounds(second), self._write_page(is_leaf, second),
+                                        *records_aggregate(is_leaf, second))
+                child_mbr, child_agg = record_bounds(first), records_aggregate(is_leaf, first)
+            else:
+                self._store_page(page_id, is_leaf, entries)
+                carry, child_mbr, child_agg = None, record_bounds(entries), records_aggregate(is_leaf, entries)
+        if carry is not None:#根分裂，树长高一层
+            root = np.concatenate([internal_record(child_mbr, self.root_page, *child_agg), carry])
+            self.root_page = self._write_page(False, root)
+            self._height += 1
+
+    #删除一个数据点，节点不足最小填充时释放该页并把剩余条目重新插入同层
+    def delete_point(self, point: Tuple[float, float, float], block_id: int, index: int) -> bool:
+        path = self._find_leaf(self.root_page, point, block_id, index)
+        if path is None:
+            return False
+        orphans = []
+        removed, child_mbr, child_agg = False, None, None
+        for depth in range(len(path) - 1, -1, -1):
+            page_id, is_leaf, entries, idx = path[depth]
+            if depth == len(path) - 1 or removed:
+                entries = np.delete(entries, idx)
+            else:
+                entries = entries.copy()
+                entries["mbr"][idx] = child_mbr
+                entries["count"][idx], entries["sum"][idx] = child_agg
+            if is_leaf:
+                entries = self._exact_records(entries)
+            if depth > 0 and len(entries) < self._min_fill(is_leaf):
+                orphans.append((entries, self._height - 1 - depth))
+                self._free_page(page_id)
+                removed = True
+            else:
+                self._store_page(page_id, is_leaf, entries)
+                removed = False
+                child_mbr = record_bounds(entries) if len(entries) else None
+                child_agg = records_aggregate(is_leaf, entries)
+        #根只剩一个孩子时降低树高
+        is_leaf, entries = self.get_node(self.root_page)
+        while not is_leaf and len(entries) == 1:
+            self._free_page(self.root_page)
+            self.root_page = int(entries["child"][0])
+            self._height -= 1
+            is_leaf, entries = self.get_node(self.root_page)
+        for entries, level in orphans:
+            self._reinsert_records(entries, level)
+        self._write_header()
+        return True
+
+    #被删节点的条目按层重新插入；树变矮到放不下这一层时拆开子树逐层下放
+    def _reinsert_records(self, entries: np.ndarray, level: int):
+        if level < self._height:
+            for i in range(len(entries)):
+                self._insert_records(entries[i:i + 1], level)
+            return
+        for child in entries["child"].tolist():
+            _, child_entries = self.get_node(child)
+            self._free_page(child)
+            self._reinsert_records(child_entries, level - 1)
+
+    #找出包含该数据点条目的叶子，返回根到叶子的 (页号, 是否叶子, 条目, 条目下标) 路径
+    def _find_leaf(self, page_id: int, point, block_id: int, index: int) -> List[Tuple]:
+        is_leaf, entries = self.get_node(page_id)
+        mbrs = entries["mbr"]
+        inside = np.all(mbrs[:, :3] <= point, axis=1) & np.all(mbrs[:, 3:] >= point, axis=1)
+        if is_leaf:
+            match = np.flatnonzero(inside & (entries["block"] == block_id) & (entries["index"] == index))
+            return [(page_id, True, entries, int(match[0]))] if len(match) else None
+        for idx in np.flatnonzero(inside).tolist():
+            path = self._find_leaf(int(entries["child"][idx]), point, block_id, index)
+            if path is not None:
+                return [(page_id, False, entries, idx)] + path
+        return None
+
+    #把新数据点追加到数据文件尾并逐个插入索引，IO只与新数据的大小有关
+    def append_points(self, points: np.ndarray) -> int:
+        block_ids, idxs = self.blocks.append(points)
+        for pt, block_id, idx in zip(np.asarray(points).reshape(-1, 3).tolist(), block_ids.tolist(), idxs.tolist()):
+            self.insert_point(pt, block_id, idx)
+        return len(block_ids)
+
+    #追加一个新写好的裸数据块文件（连续的 经度,纬度,海拔 float64）
+    def append_block_file(self, file_path: str) -> int:
+        return self.append_points(np.fromfile(file_path, "=f8").reshape(-1, 3))
+
+#读取节点中的立方体范围
+def get_tree_mbr(tree: RStarTreeDisk) -> MBR:
+    _, entries = tree.get_node(tree.root_page)
+    if not len(entries):#全部删空后根是空叶子
+        raise ValueError(f"{tree.index_path} 是空索引，没有数据范围")
+    mbrs = entries["mbr"]
+    return MBR(*mbrs[:, :3].min(axis=0).tolist(), *mbrs[:, 3:].max(axis=0).tolist())#返回最大查询范围
+
+
+#生成查询立方体：体积为数据范围的 scale 倍，aspect 为三轴边长比例（乘积归一），rng 给定时可复现
+def generate_query_mbr(root_mbr: MBR, scale: float, aspect=(1.0, 1.0, 1.0), rng=random) -> MBR:
+    lo, hi = root_mbr.to_tuple()[:3], root_mbr.to_tuple()[3:]
+    norm = (aspect[0] * aspect[1] * aspect[2]) ** (1/3)
+    box = []
+    for a in range(3):
+        extent = hi[a] - lo[a]
+        d = min(extent * scale ** (1/3) * aspect[a] / norm, extent)#边长不超过数据范围
+        c = rng.uniform(lo[a] + d/2, hi[a] - d/2)
+        box.append((c - d/2, c + d/2))
+    return MBR(*(b[0] for b in box), *(b[1] for b in box))
+
+#一组条目的外包MBR
+def record_bounds(records: np.ndarray) -> np.ndarray:
+    mbrs = records["mbr"]
+    return np.concatenate([mbrs[:, :3].min(axis=0), mbrs[:, 3:].max(axis=0)])
+
+def internal_record(mbr: np.ndarray, child: int, count: int = 0, sums=0.0) -> np.ndarray:
+    record = np.zeros(1, INTERNAL_DTYPE)
+    record["mbr"], record["child"] = mbr, child
+    record["count"], record["sum"] = count, sums
+    return record
+
+#一页条目所代表子树的 (点数, 各轴坐标和)；叶子条目须是精确坐标
+def records_aggregate(is_leaf: bool, records: np.ndarray) -> Tuple[int, np.ndarray]:
+    if is_leaf:
+        return len(records), records["mbr"][:, :3].sum(axis=0)
+    return int(records["count"].sum()), records["sum"].sum(axis=0)
+
+#R*选子树：孩子是叶子时取重叠扩展最小，否则取体积扩展最小，再按体积取小
+def choose_subtree(mbrs: np.ndarray, mbr: np.ndarray, leaf_children: bool) -> int:
+    merged = np.concatenate([np.minimum(mbrs[:, :3], mbr[:3]), np.maximum(mbrs[:, 3:], mbr[3:])], axis=1)
+    volume = np.prod(mbrs[:, 3:] - mbrs[:, :3], axis=1)
+    enlargement = np.prod(merged[:, 3:] - merged[:, :3], axis=1) - volume
+    if not leaf_children:
+        return int(np.lexsort((volume, enlargement))[0])
+    def overlaps(boxes):#每个框与所有条目的重叠体积之和，去掉与自身的
+        lo = np.maximum(boxes[:, None, :3], mbrs[None, :, :3])
+        hi = np.minimum(boxes[:, None, 3:], mbrs[None, :, 3:])
+        inter = np.prod(np.clip(hi - lo, 0, None), axis=2)
+        np.fill_diagonal(inter, 0)
+        return inter.sum(axis=1)
+    overlap_increase = overlaps(merged) - overlaps(mbrs)
+    return int(np.lexsort((volume, enlargement, overlap_increase))[0])
+
+#R*分裂：按周长和选轴，再在该轴上取重叠最小（其次体积最小）的分配
+def split_records(records: np.ndarray, min_fill: int) -> Tuple[np.ndarray, np.ndarray]:
+    mbrs = records["mbr"]
+    n = len(records)
+    ks = np.arange(min_fill, n - min_fill + 1)     #第一组的条目数
+    best_margin, candidates = None, None
+    for axis in range(3):
+        margin, orders = 0.0, []
+        for key in (mbrs[:, axis], mbrs[:, axis + 3]):
+            order = np.argsort(key, kind="stable")
+            s = mbrs[order]
+            lo1, hi1 = np.minimum.accumulate(s[:, :3]), np.maximum.accumulate(s[:, 3:])
+            lo2, hi2 = np.minimum.accumulate(s[::-1, :3])[::-1], np.maximum.accumulate(s[::-1, 3:])[::-1]
+            g1 = np.concatenate([lo1[ks - 1], hi1[ks - 1]], axis=1)
+            g2 = np.concatenate([lo2[ks], hi2[ks]], axis=1)
+            margin += (g1[:, 3:] - g1[:, :3]).sum() + (g2[:, 3:] - g2[:, :3]).sum()
+            orders.append((order, g1, g2))
+        if best_margin is None or margin < best_margin:
+            best_margin, candidates = margin, orders
+    best = None
+    for order, g1, g2 in candidates:
+        overlap = np.prod(np.clip(np.minimum(g1[:, 3:], g2[:, 3:]) - np.maximum(g1[:, :3], g2[:, :3]), 0, None), axis=1)
+        volume = np.prod(g1[:, 3:] - g1[:, :3], axis=1) + np.prod(g2[:, 3:] - g2[:, :3], axis=1)
+        i = int(np.lexsort((volume, overlap))[0])
+        cost = (overlap[i], volume[i])
+        if best is None or cost < best[0]:
+            best = (cost, order, ks[i])
+    _, order, k = best
+    return records[order[:k]], records[order[k:]]
+
+#量化格点在 [lo, hi] 上的小盒：第一格和最后一格贴住页MBR边界
+def cell_bounds(q: np.ndarray, lo: np.ndarray, hi: np.ndarray, step: np.ndarray, cells: int) -> Tuple[np.ndarray, np.ndarray]:
+    q = q.astype(float)
+    cell_lo = np.where(q <= 0, lo, lo + q * step)
+    cell_hi = np.where(q + 1 >= cells, hi, lo + (q + 1) * step)
+    return cell_lo, cell_hi
 
-#执行查询
-def run_queries(root_page_id: int):
-    root_mbr = get_tree_mbr(root_page_id)
+#把叶子条目（退化MBR即点坐标）编码成页格式的字节
+def encode_leaf(records: np.ndarray, code: int) -> bytes:
+    out = np.zeros(len(records), LEAF_PAGE_DTYPES[code])
+    out["block"], out["index"] = records["block"], records["index"]
+    pts = records["mbr"][:, :3]
+    if code not in QUANT_BITS:
+        out["pt"] = pts
+        return out.tobytes()
+    if not len(records):#删空后的根叶子：本页MBR全零，没有条目
+        return bytes(PAGE_BOX_SIZE)
+    cells = (1 << QUANT_BITS[code]) - 1
+    lo, hi = pts.min(axis=0), pts.max(axis=0)
+    step = (hi - lo) / cells
+    q = np.floor(np.divide(pts - lo, step, out=np.zeros_like(pts), where=step > 0))
+    q = np.clip(q, 0, cells - 1)
+    #浮点舍入可能差一格，按解码公式校正，保证点一定落在解码出的小盒内
+    cell_lo, cell_hi = cell_bounds(q, lo, hi, step, cells)
+    q = np.where(cell_lo > pts, q - 1, np.where(cell_hi < pts, q + 1, q))
+    out["q"] = q
+    return np.concatenate([lo, hi]).tobytes() + out.tobytes()
+
+#按页格式解码叶子条目，量化格式解出的是包含原点的格点小盒
+def decode_leaf(buf, offset: int, count: int, code: int) -> np.ndarray:
+    if code == 0:
+        return np.frombuffer(buf, LEAF_DTYPE, count, offset).copy()
+    records = np.zeros(count, LEAF_DTYPE)
+    if code in QUANT_BITS:
+        box = np.frombuffer(buf, "=f8", 6, offset)
+        offset += PAGE_BOX_SIZE
+    raw = np.frombuffer(buf, LEAF_PAGE_DTYPES[code], count, offset)
+    records["block"], records["index"] = raw["block"], raw["index"]
+    if code not in QUANT_BITS:
+        records["mbr"][:, :3] = records["mbr"][:, 3:] = raw["pt"]
+        return records
+    cells = (1 << QUANT_BITS[code]) - 1
+    lo, hi = box[:3], box[3:]
+    records["mbr"][:, :3], records["mbr"][:, 3:] = cell_bounds(raw["q"], lo, hi, (hi - lo) / cells, cells)
+    return records
+
+#整页条目与查询立方体的相交掩码
+def intersect_mask(mbrs: np.ndarray, query: MBR) -> np.ndarray:
+    q = query.to_tuple()
+    return np.all(mbrs[:, :3] <= q[3:], axis=1) & np.all(mbrs[:, 3:] >= q[:3], axis=1)
+
+#整页条目是否完全落在查询立方体内
+def contain_mask(mbrs: np.ndarray, query: MBR) -> np.ndarray:
+    q = query.to_tuple()
+    return np.all(mbrs[:, :3] >= q[:3], axis=1) & np.all(mbrs[:, 3:] <= q[3:], axis=1)
+
+#点到整页条目MBR的最小距离，w 为各轴缩放系数
+def mindist(mbrs: np.ndarray, p: np.ndarray, w: np.ndarray) -> np.ndarray:
+    d = np.maximum(np.maximum(mbrs[:, :3] - p, p - mbrs[:, 3:]), 0.0) * w
+    return np.sqrt((d * d).sum(axis=1))
+
+#按照索引查询：先遍历索引收集候选点，再按数据块分组读取
+def query_rstar_tree(tree: RStarTreeDisk, page_id: int, query: MBR, node_io: Counter, block_io: Counter, hits: List[Tuple]):
+    candidates = list(tree.iter_leaf_candidates(page_id, query, node_io))
+    fetch_points(tree.blocks, candidates, query, block_io, hits, tree.hooks)
+
+def fetch_points(blocks: DataFile, candidates: List, query: MBR, block_io: Counter, hits: List[Tuple], hooks=()):
+    for pts in iter_block_hits(blocks, candidates, query, block_io, hooks):
+        hits.extend(map(tuple, pts.tolist()))
+
+#候选点按块号分组，每个数据块只读一次，逐块产出命中点数组；block_io统计物理块读取次数，hooks 收到每块的候选数和命中数
+def iter_block_hits(blocks: DataFile, candidates: List, query: MBR, block_io: Counter, hooks=()) -> Iterator[np.ndarray]:
+    if not candidates:
+        return
+    block_ids = np.concatenate([b for b, _ in candidates])
+    idxs = np.concatenate([i for _, i in candidates])
+    order = np.argsort(block_ids, kind="stable")
+    block_ids, idxs = block_ids[order], idxs[order]
+    bounds = np.flatnonzero(np.diff(block_ids, prepend=-1, append=-1))
+    q = query.to_tuple()
+    for start, end in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+        block_id = int(block_ids[start])
+        if not 0 <= block_id < len(blocks):
+            continue
+        block_io[block_id] += 1
+        began = time.perf_counter() if hooks else 0.0
+        pts = blocks.block_points(block_id)[idxs[start:end]]
+        inside = np.all((pts >= q[:3]) & (pts <= q[3:]), axis=1)
+        for hook in hooks:#候选多于命中的部分是假阳性（叶子条目命中、点未命中）
+            hook.on_block(block_id, end - start, int(np.count_nonzero(inside)), time.perf_counter() - began)
+        yield pts[inside]
+
+#批量查询：一次遍历同时处理多个查询立方体，每个节点页和数据块在一批中最多读一次
+def batch_query(tree: RStarTreeDisk, queries: List[MBR], node_io: Counter, block_io: Counter) -> List[List[Tuple]]:
+    Q = np.array([q.to_tuple() for q in queries], dtype=float).reshape(-1, 6)
+    results = [[] for _ in queries]
+    cand_q, cand_b, cand_i = [], [], []
+    hooks = tree.hooks
+    for hook in hooks:
+        for q in queries:
+            hook.on_query(q)
+    stack = [(tree.root_page, np.arange(len(queries)), 0)]#(页号, 仍在该子树中活跃的查询编号, 距根的深度)
+    while stack:
+        page_id, active, depth = stack.pop()
+        if not 0 < page_id < tree.page_count:
+            continue
+        node_io[page_id] += 1
+        is_leaf, entries = tree.get_node(page_id)
+        mbrs, qs = entries["mbr"], Q[active]
+        #活跃查询 × 条目 的相交矩阵
+        hit = (np.all(mbrs[None, :, :3] <= qs[:, None, 3:], axis=2) &
+               np.all(mbrs[None, :, 3:] >= qs[:, None, :3], axis=2))
+        for hook in hooks:#与任一活跃查询相交的条目算作匹配
+            hook.on_node(page_id, depth, is_leaf, len(entries), int(np.count_nonzero(hit.any(axis=0))))
+        if is_leaf:
+            qi, ei = np.nonzero(hit)
+            cand_q.append(active[qi])
+            cand_b.append(entries["block"][ei])
+            cand_i.append(entries["index"][ei])
+        else:
+            children = entries["child"]
+            for j in reversed(np.flatnonzero(hit.any(axis=0)).tolist()):
+                stack.append((int(children[j]), active[hit[:, j]], depth + 1))
+    if not cand_q:
+        return results
+    qids, block_ids, idxs = np.concatenate(cand_q), np.concatenate(cand_b), np.concatenate(cand_i)
+    order = np.lexsort((qids, block_ids))#按块号分组，块内再按查询编号排
+    qids, block_ids, idxs = qids[order], block_ids[order], idxs[order]
+    bounds = np.flatnonzero(np.diff(block_ids, prepend=-1, append=-1))
+    for start, end in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+        block_id = int(block_ids[start])
+        if not 0 <= block_id < len(tree.blocks):
+            continue
+        block_io[block_id] += 1
+        began = time.perf_counter() if hooks else 0.0
+        pts = tree.blocks.block_points(block_id)[idxs[start:end]]
+        qs = Q[qids[start:end]]
+        inside = np.all((pts >= qs[:, :3]) & (pts <= qs[:, 3:]), axis=1)
+        for hook in hooks:
+            hook.on_block(block_id, end - start, int(np.count_nonzero(inside)), time.perf_counter() - began)
+        pts, q_in = pts[inside], qids[start:end][inside]
+        cuts = np.flatnonzero(np.diff(q_in, prepend=-1, append=-1)).tolist()
+        for a, b in zip(cuts[:-1], cuts[1:]):
+            results[int(q_in[a])].extend(map(tuple, pts[a:b].tolist()))
+    return results
+
+#对比逐个查询与批量查询的IO和耗时
+def run_batch_queries(tree: RStarTreeDisk, queries: List[MBR] = None) -> pd.DataFrame:
+    if queries is None:
+        root_mbr = get_tree_mbr(tree)
+        queries = [generate_query_mbr(root_mbr, PRECISION) for _ in range(NUM_QUERIES)]
+    node_io, block_io, hits = Counter(), Counter(), 0
+    start = time.time()
+    for q in queries:
+        found = []
+        query_rstar_tree(tree, tree.root_page, q, node_io, block_io, found)
+        hits += len(found)
+    single = (sum(node_io.values()), sum(block_io.values()), (time.time() - start) * 1000, hits)
+    node_io, block_io = Counter(), Counter()
+    start = time.time()
+    results = batch_query(tree, queries, node_io, block_io)
+    batch = (sum(node_io.values()), sum(block_io.values()), (time.time() - start) * 1000, sum(map(len, results)))
+    return pd.DataFrame([single, batch], index=["逐个查询", "批量查询"], columns=["节点IO", "块IO", "总耗时", "命中情况"])
+
+QUERY_COLUMNS = ["节点IO", "物理读", "缓存命中", "淘汰", "块IO", "响应时间", "命中情况"]
+
+#执行单个查询并返回一行统计和命中点
+def _timed_query(tree: RStarTreeDisk, q: MBR) -> Tuple[Tuple, List[Tuple]]:
+    node_io, block_io, hits = Counter(), Counter(), []
+    pool = tree.buffer_pool
+    before = pool.snapshot() if pool else Counter()
+    start = time.perf_counter()
+    query_rstar_tree(tree, tree.root_page, q, node_io, block_io, hits)
+    elapsed = (time.perf_counter() - start) * 1000
+    #缓冲池命中/未命中/淘汰的增量，未开缓冲池时每次访问都是物理读
+    pool_io = pool.snapshot() - before if pool else Counter(misses=sum(node_io.values()))
+    row = (sum(node_io.values()), pool_io["misses"], pool_io["hits"], pool_io["evictions"],
+           sum(block_io.values()), elapsed, len(hits))
+    return row, hits
+
+#工作进程各自打开索引：mmap 只映射文件，进程间共享操作系统页缓存
+_worker_tree = None
+
+def _init_worker(index_path: str, data_path: str, buffer_pages: int, pin_levels: int):
+    global _worker_tree
+    _worker_tree = RStarTreeDisk.open(index_path, data_path)
+    if buffer_pages:
+        _worker_tree.enable_buffer_pool(buffer_pages, pin_levels=pin_levels)
+
+#返回工作进程号，用于确认进程池中每个进程都已完成初始化
+def _worker_pid(_=None) -> int:
+    return os.getpid()
+
+#把查询切成若干小批，分给进程池
+def _query_chunks(queries: List[MBR], workers: int) -> List[List[Tuple]]:
+    chunk = ceil(len(queries) / (workers * 4)) or 1
+    return [[q.to_tuple() for q in queries[i:i + chunk]] for i in range(0, len(queries), chunk)]
+
+#工作进程执行一批查询，只带回本批第一个非空结果作为样例
+def _worker_queries(query_tuples: List[Tuple]) -> Tuple[List[Tuple], List[Tuple]]:
+    rows, sample = [], []
+    for t in query_tuples:
+        row, hits = _timed_query(_worker_tree, MBR(*t))
+        rows.append(row)
+        if not sample and hits:
+            sample = hits
+    return rows, sample
+
+#执行查询，未给定查询立方体时随机生成 NUM_QUERIES 个；workers > 1 时分给多个进程并行执行
+def run_queries(tree: RStarTreeDisk, queries: List[MBR] = None, workers: int = 1, verbose: bool = True):
+    if queries is None:
+        root_mbr = get_tree_mbr(tree)
+        queries = [generate_query_mbr(root_mbr, PRECISION) for _ in range(NUM_QUERIES)]
     stats = []
     all_hits_sample = []
 
-    for _ in range(NUM_QUERIES):
-        q = generate_query_mbr(root_mbr, PRECISION)
-        node_io, block_io, hits = Counter(), Counter(), []
-        start = time.time()
-        query_rstar_tree(root_page_id, q, node_io, block_io, hits)
-        elapsed = (time.time() - start) * 1000
-        stats.append((sum(node_io.values()), sum(block_io.values()), elapsed, len(hits)))
-        #print(block_io)
-        if not all_hits_sample and hits:
-            all_hits_sample = hits[:]
-
-    df = pd.DataFrame(stats, columns=["节点IO", "块IO", "响应时间", "命中情况"])
-    df["总IO"] = df["节点IO"] + df["块IO"]
-    print("\n总情况:")
-    print(df.sum())
+    if workers > 1:
+        pool = tree.buffer_pool
+        chunks = _query_chunks(queries, workers)
+        init_args = (tree.index_path, tree.blocks.path, pool.capacity if pool else 0, tree.pin_levels)
+        with multiprocessing.Pool(workers, _init_worker, init_args) as procs:
+            for rows, sample in procs.map(_worker_queries, chunks):#按提交顺序合并
+                stats.extend(rows)
+                if not all_hits_sample and sample:
+                    all_hits_sample = sample
+    else:
+        for q in queries:
+            row, hits = _timed_query(tree, q)
+            stats.append(row)
+            #print(block_io)
+            if not all_hits_sample and hits:
+                all_hits_sample = hits[:]
+
+    df = pd.DataFrame(stats, columns=QUERY_COLUMNS)
+    df["总IO"] = df["物理读"] + df["块IO"]
+    if verbose:
+        print("\n总情况:")
+        print(df.sum())
+        if tree.buffer_pool and workers <= 1:
+            print(f"缓冲池: {dict(tree.buffer_pool.stats)}，常驻 {len(tree.buffer_pool.pinned)} 页")
     return df.mean(), all_hits_sample
 
-#查询结果可视化
+#并行扩展性：同一组查询分别用 1..max_workers 个进程执行，报告吞吐量和加速比；
+#每种进程数都新建进程池（各进程缓冲池为空），等所有进程打开索引后只对查询本身计时
+def scale_workers(tree: RStarTreeDisk, max_workers: int = None, queries: List[MBR] = None) -> pd.DataFrame:
+    max_workers = max_workers or os.cpu_count()
+    if queries is None:
+        root_mbr = get_tree_mbr(tree)
+        queries = [generate_query_mbr(root_mbr, PRECISION) for _ in range(NUM_QUERIES)]
+    pool = tree.buffer_pool
+    init_args = (tree.index_path, tree.blocks.path, pool.capacity if pool else 0, tree.pin_levels)
+    run_queries(tree, queries, verbose=False)#先把索引和数据文件读进操作系统页缓存，各配置起点相同
+    rows = []
+    for workers in range(1, max_workers + 1):
+        chunks = _query_chunks(queries, workers)
+        with multiprocessing.Pool(workers, _init_worker, init_args) as procs:
+            ready = set()
+            while len(ready) < workers:
+                ready.update(procs.map(_worker_pid, range(workers), chunksize=1))
+            start = time.perf_counter()
+            results = procs.map(_worker_queries, chunks)
+            wall = time.perf_counter() - start
+        latency = np.mean([row[QUERY_COLUMNS.index("响应时间")] for batch, _ in results for row in batch])
+        rows.append({"进程数": workers, "总耗时": wall, "吞吐量": len(queries) / wall, "平均响应时间": latency})
+    df = pd.DataFrame(rows)
+    df["加速比"] = df["吞吐量"] / df["吞吐量"].iloc[0]
+    return df
+
+#自动调优：用同一组查询比较不同页长下的树高、节点数和平均IO
+def autotune_page_size(data_path: str = DATA_FILE, page_sizes=PAGE_SIZES, packing: str = PACKING, seed: int = 0,
+                       leaf_formats=(LEAF_FORMAT,)):
+    rows = []
+    queries = None
+    for page_size in page_sizes:
+        for leaf_format in leaf_formats:
+            index_path = f"rstar_{page_size}_{leaf_format}.idx"
+            builder = RStarTreeDisk(index_path, page_size, data_path, leaf_format=leaf_format)
+            builder.build_from_blocks(packing)
+            builder.close()
+            with RStarTreeDisk.open(index_path, data_path) as tree:
+                if queries is None:
+                    random.seed(seed)
+                    root_mbr = get_tree_mbr(tree)
+                    queries = [generate_query_mbr(root_mbr, PRECISION) for _ in range(NUM_QUERIES)]
+                avg, _ = run_queries(tree, queries, verbose=False)
+                rows.append({"页长": page_size, "叶子格式": leaf_format, "叶子扇出": tree.leaf_fanout,
+                             "内部扇出": tree.internal_fanout,
+                             "树高": tree.height, "节点数": tree.page_count - 1,
+                             "平均节点IO": avg["节点IO"], "平均块IO": avg["块IO"], "平均响应时间": avg["响应时间"]})
+    return pd.DataFrame(rows)
+
+#同一批查询下比较不同数据块布局的块IO：聚簇布局的数据文件不存在时先由原始文件生成
+def compare_layouts(data_path: str = DATA_FILE, layouts=LAYOUTS, page_size: int = PAGE_SIZE,
+                    packing: str = PACKING, seed: int = 0) -> pd.DataFrame:
+    rows = []
+    queries = None
+    base = os.path.splitext(data_path)[0]
+    for layout in layouts:
+        layout_path = data_path if layout == "file" else f"{base}_{layout}.dat"
+        if not os.path.exists(layout_path):
+            cluster_data_file(data_path, layout_path, layout)
+        index_path = f"{base}_{layout}.idx"
+        builder = RStarTreeDisk(index_path, page_size, layout_path)
+        builder.build_from_blocks(packing)
+        builder.close()
+        with RStarTreeDisk.open(index_path, layout_path) as tree:
+            if queries is None:
+                random.seed(seed)
+                root_mbr = get_tree_mbr(tree)
+                queries = [generate_query_mbr(root_mbr, PRECISION) for _ in range(NUM_QUERIES)]
+            avg, _ = run_queries(tree, queries, verbose=False)
+            rows.append({"布局": layout, "数据块数": len(tree.blocks), "平均节点IO": avg["节点IO"],
+                         "平均块IO": avg["块IO"], "平均命中点数": avg["命中情况"], "平均响应时间": avg["响应时间"]})
+    return pd.DataFrame(rows)
+
+#删空再插回的回归检查：每种叶子格式用数据文件前 sample 个点建一棵小索引，逐点删光后再逐点插回，核对根节点和计数
+def check_delete_all(data_path: str = DATA_FILE, page_size: int = 1024, leaf_formats=tuple(LEAF_FORMATS),
+                     sample: int = 600, pin_levels: int = PIN_LEVELS) -> pd.DataFrame:
+    rows = []
+    with DataFile(data_path) as src:
+        pts = src.points()[:sample]
+    bounds = MBR(*pts.min(axis=0).tolist(), *pts.max(axis=0).tolist())
+    with tempfile.TemporaryDirectory() as tmp:
+        sample_path = os.path.join(tmp, "sample.dat")
+        with DataFile.create(sample_path) as data:
+            block_ids, idxs = data.append(pts)
+        refs = list(zip(pts.tolist(), block_ids.tolist(), idxs.tolist()))
+        for leaf_format in leaf_formats:
+            index_path = os.path.join(tmp, f"{leaf_format}.idx")
+            builder = RStarTreeDisk(index_path, page_size, sample_path, leaf_format=leaf_format)
+            builder.build_from_blocks()
+            builder.close()
+            with RStarTreeDisk.open(index_path, sample_path, writable=True) as tree:
+                tree.enable_buffer_pool(BUFFER_PAGES, pin_levels=pin_levels)
+                deleted = sum(tree.delete_point(pt, block_id, idx) for pt, block_id, idx in refs)
+                is_leaf, entries = tree.get_node(tree.root_page)
+                emptied = is_leaf and not len(entries)
+                for pt, block_id, idx in refs:
+                    tree.insert_point(pt, block_id, idx)
+                count = tree.range_count(bounds)
+            rows.append({"叶子格式": leaf_format, "点数": len(pts), "删除数": deleted, "删空": emptied,
+                         "插回后计数": count, "通过": deleted == len(pts) and emptied and count == len(pts)})
+    return pd.DataFrame(rows)
+
+#把查询结果流式写入文本文件，返回写入的点数
+def write_hits(hits, path: str) -> int:
+    n = 0
+    with open(path, "w") as f:
+        for lon, lat, alt in hits:
+            f.write(f"{lon},{lat},{alt}\n")
+            n += 1
+    return n
+
+#查询结果可视化，hits 可以是列表或 range_query 返回的生成器
 def visualize_hits(hits):
+    hits = list(hits)
     if not hits:
         print("无查找结果666")
         return
@@ -244,13 +1270,45 @@ if __name__ == "__main__":
     #建立索引模式
     if mode == "build":
         tree = RStarTreeDisk()
-        tree.build_from_blocks(BLOCK_FILES)
-        print(f"[INFO] 构建完成，根节点为 node_{tree.root_page}.bin")
-        with open("root_page.txt", "w") as f:
-            f.write(str(tree.root_page))
+        tree.build_from_blocks(PACKING)
+        print(f"[INFO] 构建完成，根节点为第 {tree.root_page} 页，共 {tree.page_count} 页，写入 {tree.index_path}")
+        print(pd.DataFrame(tree.level_stats).to_string(index=False))
+    #外存构建模式：点数超过内存时使用
+    elif mode == "external":
+        tree = RStarTreeDisk()
+        report = tree.build_external(MEMORY_BUDGET)
+        print(f"[INFO] 外存构建完成，根节点为第 {tree.root_page} 页: {report}")
+    #页长自动调优模式
+    elif mode == "tune":
+        print(autotune_page_size(DATA_FILE, leaf_formats=tuple(LEAF_FORMATS)).to_string(index=False))
+    #数据块布局对比模式：按轨迹文件顺序 vs 沿空间填充曲线聚簇
+    elif mode == "layout":
+        print(compare_layouts(DATA_FILE).to_string(index=False))
+    #k近邻查询模式：查找离数据范围中心最近的点
+    elif mode == "knn":
+        with RStarTreeDisk.open(INDEX_FILE) as tree:
+            root_mbr = get_tree_mbr(tree)
+            center = tuple(root_mbr.center(a) for a in range(3))
+            node_io, block_io = Counter(), Counter()
+            for dist, pt in tree.knn_query(center, 10, GEO_SCALE, node_io, block_io):
+                print(f"{dist:.1f}m {pt}")
+            print(f"节点IO: {sum(node_io.values())}，块IO: {sum(block_io.values())}")
+    #批量查询模式
+    elif mode == "batch":
+        with RStarTreeDisk.open(INDEX_FILE) as tree:
+            print(run_batch_queries(tree))
+    #并行查询扩展性测试模式
+    elif mode == "scale":
+        with RStarTreeDisk.open(INDEX_FILE) as tree:
+            print(scale_workers(tree, WORKERS).to_string(index=False))
+    #删空再插回的回归检查模式：量化格式的空根叶子也要能写回
+    elif mode == "churn":
+        print(check_delete_all(DATA_FILE).to_string(index=False))
     #空间查询模式
     elif mode == "query":
-            avg_stats, samples = run_queries(74795)
+        with RStarTreeDisk.open(INDEX_FILE) as tree:#根页号从超级块读取
+            tree.enable_buffer_pool(BUFFER_PAGES, pin_levels=PIN_LEVELS)
+            avg_stats, samples = run_queries(tree)
             print("查询完成，平均统计如下：")
             print(avg_stats)
             print("查询结果:")
@@ -0,0 +1,160 @@
+import csv
+import json
+import os
+import random
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from Rstartree import (BUFFER_PAGES, LEAF_FORMAT, MBR, PACKING, PAGE_SIZE, RStarTreeDisk, _timed_query,
+                       generate_query_mbr)
+from datafile import DATA_FILE, DataFile
+
+#可复现的构建与查询基准：固定种子生成多种选择度和形状的查询，冷/热缓存各跑一遍，并以顺序扫描为基线
+#cold 在每个查询前清空缓冲池并丢弃索引和数据文件的操作系统页缓存；平台不支持丢弃页缓存时结果中“逐出页缓存”为 False
+BENCH_SEED = 42
+BENCH_QUERIES = 50                      #每种 (选择度, 形状) 的查询个数
+SELECTIVITIES = (1e-5, 1e-4, 1e-3, 1e-2)    #查询立方体体积占数据范围的比例
+QUERY_SHAPES = {                        #三轴边长比例
+    "cube": (1.0, 1.0, 1.0),
+    "flat": (4.0, 4.0, 1 / 16),         #水平薄片：大范围、窄海拔
+    "column": (1 / 4, 1 / 4, 16.0),     #竖直柱：小范围、全海拔
+    "strip": (16.0, 1 / 4, 1 / 4),      #东西向长条
+}
+PERCENTILES = (50, 95, 99)
+CACHE_MODES = ("cold", "warm")
+BENCH_CONFIGS = [
+    {"page_size": PAGE_SIZE, "packing": PACKING, "leaf_format": LEAF_FORMAT},
+    {"page_size": PAGE_SIZE, "packing": "hilbert", "leaf_format": LEAF_FORMAT},
+    {"page_size": PAGE_SIZE, "packing": PACKING, "leaf_format": "q16"},
+]
+RESULT_JSON = "bench_results.json"
+RESULT_CSV = "bench_results.csv"
+
+
+#按种子生成工作负载：[(选择度, 形状名, 查询列表)]
+def make_workload(root_mbr: MBR, selectivities=SELECTIVITIES, shapes: Dict = QUERY_SHAPES,
+                  n: int = BENCH_QUERIES, seed: int = BENCH_SEED) -> List[Tuple[float, str, List[MBR]]]:
+    rng = random.Random(seed)
+    return [(sel, name, [generate_query_mbr(root_mbr, sel, aspect, rng) for _ in range(n)])
+            for sel in selectivities for name, aspect in shapes.items()]
+
+
+#整个数据文件的外包范围（顺序扫描一遍）
+def data_mbr(data: DataFile) -> MBR:
+    lo, hi = np.full(3, np.inf), np.full(3, -np.inf)
+    for block_id in range(len(data)):
+        pts = data.block_points(block_id)
+        lo, hi = np.minimum(lo, pts.min(axis=0)), np.maximum(hi, pts.max(axis=0))
+    return MBR(*lo.tolist(), *hi.tolist())
+
+
+#基线：不用索引，逐块顺序扫描数据文件
+def scan_query(data: DataFile, q: MBR) -> Tuple[int, int]:
+    t = q.to_tuple()
+    hits = 0
+    for block_id in range(len(data)):
+        pts = data.block_points(block_id)
+        hits += int(np.count_nonzero(np.all((pts >= t[:3]) & (pts <= t[3:]), axis=1)))
+    return hits, len(data)
+
+
+#按配置批量构建索引，返回索引路径和构建耗时（秒）
+def build_index(config: Dict, data_path: str = DATA_FILE) -> Tuple[str, float]:
+    index_path = "bench_{page_size}_{packing}_{leaf_format}.idx".format(**config)
+    start = time.perf_counter()
+    tree = RStarTreeDisk(index_path, config["page_size"], data_path, leaf_format=config["leaf_format"])
+    tree.build_from_blocks(config["packing"])
+    tree.close()
+    return index_path, time.perf_counter() - start
+
+
+#一组查询的汇总：平均IO、命中数和延迟分位数（毫秒）
+def summarize(rows: List[Tuple]) -> Dict:
+    rows = np.array(rows, dtype=float).reshape(-1, 7)
+    latency = rows[:, 5]
+    summary = {"查询数": len(rows), "节点IO": rows[:, 0].mean(), "物理读": rows[:, 1].mean(),
+               "缓存命中": rows[:, 2].mean(), "块IO": rows[:, 4].mean(), "命中点数": rows[:, 6].mean(),
+               "平均延迟ms": latency.mean()}
+    for p, v in zip(PERCENTILES, np.percentile(latency, PERCENTILES)):
+        summary[f"p{p}延迟ms"] = v
+    return summary
+
+
+#冷缓存：每个查询前换一个空缓冲池并丢弃文件页缓存，节点和数据块访问都是磁盘读；热缓存：先把整组查询跑一遍预热再计时
+def run_workload(tree: RStarTreeDisk, queries: List[MBR], cache: str, buffer_pages: int = BUFFER_PAGES) -> Dict:
+    rows = []
+    evicted = cache == "cold"
+    if cache == "warm":
+        tree.enable_buffer_pool(buffer_pages)
+        for q in queries:
+            _timed_query(tree, q)
+    for q in queries:
+        if cache == "cold":
+            tree.enable_buffer_pool(buffer_pages)
+            evicted = tree.drop_os_cache() and evicted
+        rows.append(_timed_query(tree, q)[0])
+    tree.buffer_pool = None
+    return {**summarize(rows), "逐出页缓存": evicted}
+
+
+#顺序扫描基线的同格式汇总：每个查询读全部数据块，没有节点IO
+def run_scan(data: DataFile, queries: List[MBR]) -> Dict:
+    rows = []
+    for q in queries:
+        start = time.perf_counter()
+        hits, blocks = scan_query(data, q)
+        rows.append((0, 0, 0, 0, blocks, (time.perf_counter() - start) * 1000, hits))
+    return summarize(rows)
+
+
+#完整基准：每种配置构建一次索引，对每组查询分别跑冷/热缓存；结果为扁平记录列表
+def run_benchmark(data_path: str = DATA_FILE, configs: List[Dict] = BENCH_CONFIGS, seed: int = BENCH_SEED,
+                  n: int = BENCH_QUERIES, selectivities=SELECTIVITIES, shapes: Dict = QUERY_SHAPES,
+                  scan: bool = True) -> List[Dict]:
+    with DataFile(data_path) as data:
+        workload = make_workload(data_mbr(data), selectivities, shapes, n, seed)
+        records = []
+        if scan:
+            for sel, shape, queries in workload:
+                records.append({"配置": "scan", "选择度": sel, "形状": shape, "缓存": "-", "构建秒": 0.0,
+                                **run_scan(data, queries)})
+    for config in configs:
+        index_path, build_seconds = build_index(config, data_path)
+        name = "{page_size}/{packing}/{leaf_format}".format(**config)
+        with RStarTreeDisk.open(index_path, data_path) as tree:
+            info = {"页数": tree.page_count, "树高": tree.height, "索引字节": os.path.getsize(index_path)}
+            for sel, shape, queries in workload:
+                for cache in CACHE_MODES:
+                    records.append({"配置": name, "选择度": sel, "形状": shape, "缓存": cache,
+                                    "构建秒": build_seconds, **info, **run_workload(tree, queries, cache)})
+    return records
+
+
+#结果写成 JSON 和 CSV，便于在不同配置和版本之间对比回归
+def write_results(records: List[Dict], json_path: str = RESULT_JSON, csv_path: str = RESULT_CSV):
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(records, f, ensure_ascii=False, indent=1)
+    fields = []
+    for record in records:
+        fields.extend(k for k in record if k not in fields)
+    with open(csv_path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.DictWriter(f, fields)
+        writer.writeheader()
+        writer.writerows(records)
+
+
+if __name__ == "__main__":
+    mode = "bench" #设置程序执行模式
+    if mode == "bench":
+        records = run_benchmark(DATA_FILE)
+        write_results(records)
+        print(f"[INFO] {len(records)} 组结果写入 {RESULT_JSON} / {RESULT_CSV}")
+    #快速模式：只测默认配置的一种选择度
+    elif mode == "quick":
+        records = run_benchmark(DATA_FILE, BENCH_CONFIGS[:1], selectivities=(1e-3,))
+        write_results(records)
+        for r in records:
+            print(r["配置"], r["形状"], r["缓存"], f"{r['p50延迟ms']:.3f}/{r['p95延迟ms']:.3f}/{r['p99延迟ms']:.3f}ms",
+                  f"节点IO {r['节点IO']:.1f} 块IO {r['块IO']:.1f}")
@@ -0,0 +1,101 @@
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, Optional
+
+
+#最近最少使用：命中时移到队尾，淘汰队首
+class LRUPolicy:
+    def __init__(self):
+        self._order = OrderedDict()
+
+    def record_insert(self, key):
+        self._order[key] = None
+
+    def record_access(self, key):
+        self._order.move_to_end(key)
+
+    def remove(self, key):
+        self._order.pop(key, None)
+
+    def victim(self):
+        return next(iter(self._order))
+
+
+#先进先出：命中不改变顺序
+class FIFOPolicy(LRUPolicy):
+    def record_access(self, key):
+        pass
+
+
+EVICTION_POLICIES = {"lru": LRUPolicy, "fifo": FIFOPolicy}
+
+
+#节点页缓冲池：容量按页数或字节数给定，钉住的页不参与淘汰也不占容量
+class BufferPool:
+    def __init__(self, loader: Callable[[int], object], capacity_pages: Optional[int] = None,
+                 capacity_bytes: Optional[int] = None, page_size: int = 4096, policy="lru"):
+        if capacity_pages is None:
+            capacity_pages = capacity_bytes // page_size if capacity_bytes else 1024
+        self.capacity = max(1, capacity_pages)
+        self.loader = loader                #缓存未命中时的物理读取函数
+        self.policy = EVICTION_POLICIES[policy]() if isinstance(policy, str) else policy
+        self.frames: Dict[int, object] = {}
+        self.pinned: Dict[int, object] = {}
+        self.stats = Counter(hits=0, misses=0, evictions=0)
+
+    def get(self, page_id: int):
+        node = self.pinned.get(page_id)
+        if node is not None:
+            self.stats["hits"] += 1
+            return node
+        node = self.frames.get(page_id)
+        if node is not None:
+            self.stats["hits"] += 1
+            self.policy.record_access(page_id)
+            return node
+        self.stats["misses"] += 1
+        return self.put(page_id, self.loader(page_id))
+
+    #放入一页已读出的节点，满时按策略淘汰
+    def put(self, page_id: int, node):
+        if page_id in self.frames:
+            self.frames[page_id] = node
+            return node
+        if len(self.frames) >= self.capacity:
+            victim = self.policy.victim()
+            self.policy.remove(victim)
+            del self.frames[victim]
+            self.stats["evictions"] += 1
+        self.frames[page_id] = node
+        self.policy.record_insert(page_id)
+        return node
+
+    def __contains__(self, page_id: int) -> bool:
+        return page_id in self.pinned or page_id in self.frames
+
+    #常驻内存的页（如根和上层节点）
+    def pin(self, page_id: int):
+        if page_id in self.pinned:
+            return
+        node = self.frames.pop(page_id, None)
+        if node is None:
+            self.stats["misses"] += 1
+            node = self.loader(page_id)
+        else:
+            self.policy.remove(page_id)
+        self.pinned[page_id] = node
+
+    #页被改写后丢弃缓存副本，钉住的页重新读入
+    def invalidate(self, page_id: int):
+        if page_id in self.pinned:
+            self.pinned[page_id] = self.loader(page_id)
+        elif self.frames.pop(page_id, None) is not None:
+            self.policy.remove(page_id)
+
+    #页被释放后丢弃缓存副本（含钉住的），不再重新读入
+    def discard(self, page_id: int):
+        self.pinned.pop(page_id, None)
+        if self.frames.pop(page_id, None) is not None:
+            self.policy.remove(page_id)
+
+    def snapshot(self) -> Counter:
+        return Counter(self.stats)
@@ -0,0 +1,64 @@
+import numpy as np
+
+HILBERT_BITS = 16       #空间填充曲线每维的量化位数，三维共48位
+
+
+#把坐标按给定范围量化为 0..2^bits-1 的整数格点
+def quantize(coords: np.ndarray, lo, hi, bits: int = HILBERT_BITS) -> np.ndarray:
+    coords = np.asarray(coords, dtype=float).reshape(-1, 3)
+    lo = np.asarray(lo, dtype=float)
+    span = np.asarray(hi, dtype=float) - lo
+    span[span <= 0] = 1.0
+    cells = (1 << bits) - 1
+    return np.clip((coords - lo) / span * cells, 0, cells).astype(np.uint64)
+
+
+#三维Hilbert曲线序号（Skilling的转置算法，按列向量化）
+def hilbert_keys(cells: np.ndarray, bits: int = HILBERT_BITS) -> np.ndarray:
+    X = [cells[:, i].astype(np.uint64) for i in range(3)]
+    q = 1 << (bits - 1)
+    while q > 1:
+        p = np.uint64(q - 1)
+        for i in range(3):
+            has = (X[i] & np.uint64(q)) != 0
+            if i == 0:
+                X[0] = np.where(has, X[0] ^ p, X[0])
+                continue
+            t = np.where(has, np.uint64(0), (X[0] ^ X[i]) & p)
+            X[0] = np.where(has, X[0] ^ p, X[0] ^ t)
+            X[i] = X[i] ^ t
+        q >>= 1
+    X[1] ^= X[0]
+    X[2] ^= X[1]
+    t = np.zeros_like(X[0])
+    q = 1 << (bits - 1)
+    while q > 1:
+        t ^= np.where((X[2] & np.uint64(q)) != 0, np.uint64(q - 1), np.uint64(0))
+        q >>= 1
+    h = np.zeros_like(X[0])
+    for b in range(bits - 1, -1, -1):
+        for i in range(3):
+            h = (h << np.uint64(1)) | (((X[i] ^ t) >> np.uint64(b)) & np.uint64(1))
+    return h
+
+
+#三维Z序（Morton）曲线序号：按位交错三个坐标
+def morton_keys(cells: np.ndarray, bits: int = HILBERT_BITS) -> np.ndarray:
+    X = [cells[:, i].astype(np.uint64) for i in range(3)]
+    h = np.zeros_like(X[0])
+    for b in range(bits - 1, -1, -1):
+        for i in range(3):
+            h = (h << np.uint64(1)) | ((X[i] >> np.uint64(b)) & np.uint64(1))
+    return h
+
+
+CURVE_KEYS = {"hilbert": hilbert_keys, "zorder": morton_keys}
+
+
+#点沿空间填充曲线的次序（稳定排序，同一格点内保持原顺序）
+def curve_order(points: np.ndarray, curve: str = "hilbert", bits: int = HILBERT_BITS) -> np.ndarray:
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    if not len(points):
+        return np.empty(0, dtype=np.int64)
+    cells = quantize(points, points.min(0), points.max(0), bits)
+    return np.argsort(CURVE_KEYS[curve](cells, bits), kind="stable")
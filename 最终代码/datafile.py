@@ -0,0 +1,165 @@
+import mmap
+import os
+import struct
+from math import ceil
+from typing import Tuple
+
+import numpy as np
+
+from curves import curve_order
+
+#数据文件：第一个块大小的区域是文件头，之后是定长数据块，除最后一块外都装满
+DATA_FILE = "blocks.dat"
+BLOCK_SIZE = 8192
+POINT_STRUCT = "ddd"                #经度、纬度、海拔
+POINT_SIZE = struct.calcsize(POINT_STRUCT)
+POINTS_PER_BLOCK = BLOCK_SIZE // POINT_SIZE
+DATA_MAGIC = b"BLKS"
+DATA_VERSION = 1
+DATA_HEADER_STRUCT = "=4si8siqq"    #魔数、版本、点格式、块长、块数、点数
+ORDER_SUFFIX = ".order.npy"         #聚簇布局下新位置到原始（轨迹文件）顺序的映射
+
+
+class DataFile:
+    def __init__(self, path: str = DATA_FILE, writable: bool = False):
+        self.path = path
+        self._file = open(path, "r+b" if writable else "rb")
+        self._mm = None
+        magic, version, point_format, block_size, block_count, point_count = \
+            struct.unpack(DATA_HEADER_STRUCT, self._file.read(struct.calcsize(DATA_HEADER_STRUCT)))
+        if magic != DATA_MAGIC or version != DATA_VERSION or point_format.rstrip(b"\0") != POINT_STRUCT.encode():
+            self._file.close()
+            raise ValueError(f"{path} 不是有效的数据文件")
+        self.block_size = block_size
+        self.points_per_block = block_size // POINT_SIZE
+        self.block_count = block_count
+        self.point_count = point_count
+        self._remap()
+        if not writable:
+            self._file.close()
+            self._file = None
+
+    #新建只有文件头的空数据文件
+    @classmethod
+    def create(cls, path: str = DATA_FILE, block_size: int = BLOCK_SIZE) -> "DataFile":
+        if os.path.exists(order_path(path)):#旧内容的顺序映射随之作废
+            os.remove(order_path(path))
+        with open(path, "wb") as f:
+            f.write(struct.pack(DATA_HEADER_STRUCT, DATA_MAGIC, DATA_VERSION, POINT_STRUCT.encode(),
+                                block_size, 0, 0).ljust(block_size, b"\0"))
+        return cls(path, writable=True)
+
+    def __len__(self):
+        return self.block_count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def drop_os_cache(self) -> bool:
+        return drop_os_cache(self.path, self._mm)
+
+    def _offset(self, block_id: int) -> int:
+        return (block_id + 1) * self.block_size
+
+    def _remap(self):
+        if self._mm is not None:
+            self._mm.close()
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    #块内点数：只有最后一块可能不满
+    def block_len(self, block_id: int) -> int:
+        return min(self.points_per_block, self.point_count - block_id * self.points_per_block)
+
+    #数据块在mmap上的 n×3 坐标视图（不拷贝）
+    def block_points(self, block_id: int) -> np.ndarray:
+        return np.frombuffer(self._mm, "=f8", self.block_len(block_id) * 3, self._offset(block_id)).reshape(-1, 3)
+
+    #按块顺序拷贝出全部点
+    def points(self) -> np.ndarray:
+        blocks = np.ndarray((self.block_count, self.points_per_block, 3), "=f8", self._mm, self.block_size,
+                            (self.block_size, POINT_SIZE, 8))
+        out = np.empty((self.point_count, 3), "=f8")
+        full, rest = divmod(self.point_count, self.points_per_block)
+        out[:full * self.points_per_block].reshape(full, -1, 3)[:] = blocks[:full]
+        out[full * self.points_per_block:] = blocks[full:full + 1, :rest].reshape(-1, 3)
+        return out
+
+    #(块号, 块内位置) 换算为文件内的全局点序号
+    def point_ids(self, block_ids, idxs) -> np.ndarray:
+        return np.asarray(block_ids, dtype=np.int64) * self.points_per_block + idxs
+
+    #在文件尾追加点：先补满最后一块再开新块，返回新点的 (块号, 块内位置)
+    def append(self, points: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        points = np.ascontiguousarray(points, dtype="=f8").reshape(-1, 3)
+        start, ppb = self.point_count, self.points_per_block
+        pos = 0
+        while pos < len(points):
+            block_id, idx = divmod(start + pos, ppb)
+            n = min(ppb - idx, len(points) - pos)
+            self._file.seek(self._offset(block_id) + idx * POINT_SIZE)
+            points[pos:pos + n].tofile(self._file)
+            pos += n
+        self.point_count += len(points)
+        self.block_count = ceil(self.point_count / ppb)
+        self._file.truncate(self._offset(self.block_count))#最后一块补齐到块长
+        self._file.seek(0)
+        self._file.write(struct.pack(DATA_HEADER_STRUCT, DATA_MAGIC, DATA_VERSION, POINT_STRUCT.encode(),
+                                     self.block_size, self.block_count, self.point_count))
+        self._file.flush()
+        self._remap()
+        ids = np.arange(start, self.point_count)
+        return ids // ppb, ids % ppb
+
+
+#让内核丢弃文件的页缓存，下次读取成为真正的磁盘IO：先解除本进程映射上的页，再 POSIX_FADV_DONTNEED；
+#平台不支持时返回 False
+def drop_os_cache(path: str, mm: mmap.mmap = None) -> bool:
+    if not hasattr(os, "posix_fadvise"):
+        return False
+    if mm is not None and hasattr(mmap, "MADV_DONTNEED"):
+        mm.madvise(mmap.MADV_DONTNEED)
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+    return True
+
+
+def order_path(data_path: str) -> str:
+    return os.path.splitext(data_path)[0] + ORDER_SUFFIX
+
+
+#读取聚簇布局的映射：order[新全局序号] = 原始全局序号；按文件顺序写出的数据没有映射
+def load_order(data_path: str):
+    path = order_path(data_path)
+    return np.load(path, mmap_mode="r") if os.path.exists(path) else None
+
+
+#把数据文件中的点沿空间填充曲线重排后写成新数据文件，使空间相近的点落在同一块里；
+#同时保存回到原始顺序的映射（源文件本身已聚簇时映射会复合）
+def cluster_data_file(src_path: str = DATA_FILE, dst_path: str = None, curve: str = "hilbert") -> np.ndarray:
+    dst_path = dst_path or os.path.splitext(src_path)[0] + f"_{curve}.dat"
+    with DataFile(src_path) as src:
+        points = src.points()
+        block_size = src.block_size
+    local = curve_order(points, curve)
+    prev = load_order(src_path)
+    order = local if prev is None else np.asarray(prev)[local]
+    tmp_path = dst_path + ".tmp"
+    with DataFile.create(tmp_path, block_size) as dst:
+        dst.append(points[local])
+    os.replace(tmp_path, dst_path)#源和目标相同时原地替换
+    np.save(order_path(dst_path), order)
+    return order
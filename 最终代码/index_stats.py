@@ -0,0 +1,154 @@
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from Rstartree import INDEX_FILE, MBR, RStarTreeDisk, get_tree_mbr, generate_query_mbr, query_rstar_tree, record_bounds
+from datafile import DATA_FILE
+
+#整棵索引的质量分析，以及挂在查询遍历上的探针
+PROFILE_QUERIES = 100
+PROFILE_PRECISION = 1e-3
+
+
+#一层节点MBR两两重叠体积之和：按 minx 排序后只和 x 方向可能相交的后继比较
+def pairwise_overlap(mbrs: np.ndarray) -> float:
+    mbrs = mbrs[np.argsort(mbrs[:, 0], kind="stable")]
+    ends = np.searchsorted(mbrs[:, 0], mbrs[:, 3], side="right")
+    total = 0.0
+    for i in range(len(mbrs) - 1):
+        others = mbrs[i + 1:ends[i]]
+        if not len(others):
+            continue
+        d = np.minimum(others[:, 3:], mbrs[i, 3:]) - np.maximum(others[:, :3], mbrs[i, :3])
+        total += float(np.prod(np.clip(d, 0.0, None), axis=1).sum())
+    return total
+
+
+#逐层扫描整棵树：节点数、条目数、平均填充率、MBR总体积、总边长（margin）和两两重叠；层号0为叶子层
+def analyze_index(tree: RStarTreeDisk) -> pd.DataFrame:
+    rows = []
+    level = [tree.root_page]
+    height = tree.height
+    depth = 0
+    while level:
+        is_leaf = None
+        counts, mbrs, next_level = [], [], []
+        for page_id in level:
+            is_leaf, entries = tree.read_node(page_id)
+            counts.append(len(entries))
+            if len(entries):
+                mbrs.append(record_bounds(entries))
+            if not is_leaf:
+                next_level.extend(entries["child"].tolist())
+        mbrs = np.array(mbrs).reshape(-1, 6)
+        extent = mbrs[:, 3:] - mbrs[:, :3]
+        fanout = tree.leaf_fanout if is_leaf else tree.internal_fanout
+        rows.append({"层": height - 1 - depth, "节点数": len(level), "条目数": sum(counts),
+                     "平均填充率": sum(counts) / (len(level) * fanout), "最少条目": min(counts), "最多条目": max(counts),
+                     "总体积": float(np.prod(extent, axis=1).sum()), "总边长": float(extent.sum()),
+                     "两两重叠": pairwise_overlap(mbrs)})
+        level = next_level
+        depth += 1
+    return pd.DataFrame(rows)
+
+
+#查询探针接口：按需覆盖这些回调；树上挂探针后遍历代码不用改。范围查询、计数/聚合、kNN、批量查询都会触发，
+#kNN 的 on_query 收到查询点的退化MBR，批量查询对批中每个查询各触发一次 on_query
+class QueryHook:
+    def on_query(self, query: MBR):
+        pass
+
+    #物理读一页：io_seconds 为从文件映射拷出整页，decode_seconds 为解码成条目
+    def on_page_read(self, page_id: int, io_seconds: float, decode_seconds: float):
+        pass
+
+    #访问一个节点：entry_count 个条目中有 matched 个与查询相交
+    def on_node(self, page_id: int, depth: int, is_leaf: bool, entry_count: int, matched: int):
+        pass
+
+    #读一个数据块：candidates 个候选点中 hits 个真正落在查询内
+    def on_block(self, block_id: int, candidates: int, hits: int, seconds: float):
+        pass
+
+
+#累计型探针：每层访问数、剪枝比例、假阳性，以及读页/解码/读块的耗时
+class QueryProfile(QueryHook):
+    def __init__(self):
+        self.queries = 0
+        self.visits = Counter()             #深度 -> 访问节点数
+        self.entries = Counter()            #深度 -> 检查的条目数
+        self.pruned = defaultdict(float)    #深度 -> 各节点剪枝比例之和
+        self.reads = Counter(pages=0, blocks=0)
+        self.seconds = Counter(io=0.0, decode=0.0, blocks=0.0)
+        self.candidates = 0
+        self.hits = 0
+
+    def on_query(self, query: MBR):
+        self.queries += 1
+
+    def on_page_read(self, page_id: int, io_seconds: float, decode_seconds: float):
+        self.reads["pages"] += 1
+        self.seconds["io"] += io_seconds
+        self.seconds["decode"] += decode_seconds
+
+    def on_node(self, page_id: int, depth: int, is_leaf: bool, entry_count: int, matched: int):
+        self.visits[depth] += 1
+        self.entries[depth] += entry_count
+        self.pruned[depth] += 1 - matched / entry_count if entry_count else 0.0
+
+    def on_block(self, block_id: int, candidates: int, hits: int, seconds: float):
+        self.reads["blocks"] += 1
+        self.seconds["blocks"] += seconds
+        self.candidates += candidates
+        self.hits += hits
+
+    #按深度（0为根）汇总访问情况
+    def levels(self) -> pd.DataFrame:
+        queries = max(self.queries, 1)
+        return pd.DataFrame([{"深度": d, "访问节点数": n, "每查询访问": n / queries,
+                              "检查条目数": self.entries[d], "平均剪枝比例": self.pruned[d] / n}
+                             for d, n in sorted(self.visits.items())])
+
+    def summary(self) -> Dict:
+        queries = max(self.queries, 1)
+        false_positives = self.candidates - self.hits
+        return {"查询数": self.queries, "每查询物理读页": self.reads["pages"] / queries,
+                "每查询读块": self.reads["blocks"] / queries,
+                "读页耗时ms": self.seconds["io"] * 1000, "解码耗时ms": self.seconds["decode"] * 1000,
+                "读块耗时ms": self.seconds["blocks"] * 1000,
+                "候选条目": self.candidates, "命中点": self.hits, "假阳性": false_positives,
+                "假阳性率": false_positives / self.candidates if self.candidates else 0.0}
+
+
+#挂上 QueryProfile 执行一组查询，返回探针（查询结束后摘下）
+def profile_queries(tree: RStarTreeDisk, queries: List[MBR]) -> QueryProfile:
+    profile = tree.add_hook(QueryProfile())
+    try:
+        for q in queries:
+            query_rstar_tree(tree, tree.root_page, q, Counter(), Counter(), [])
+    finally:
+        tree.remove_hook(profile)
+    return profile
+
+
+if __name__ == "__main__":
+    mode = "analyze" #设置程序执行模式
+    #整棵树的逐层质量
+    if mode == "analyze":
+        with RStarTreeDisk.open(INDEX_FILE, DATA_FILE) as tree:
+            print(f"页长 {tree.page_size}，叶子格式 {tree.leaf_format}，树高 {tree.height}，共 {tree.page_count} 页")
+            print(analyze_index(tree).to_string(index=False))
+    #查询剖析：时间花在哪一层、读页还是解码
+    elif mode == "profile":
+        with RStarTreeDisk.open(INDEX_FILE, DATA_FILE) as tree:
+            root_mbr = get_tree_mbr(tree)
+            queries = [generate_query_mbr(root_mbr, PROFILE_PRECISION) for _ in range(PROFILE_QUERIES)]
+            start = time.perf_counter()
+            profile = profile_queries(tree, queries)
+            print(f"总耗时 {(time.perf_counter() - start) * 1000:.1f}ms")
+            print(profile.levels().to_string(index=False))
+            for key, value in profile.summary().items():
+                print(f"{key}: {value}")
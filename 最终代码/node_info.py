@@ -1,9 +1,16 @@
 import os
 import struct
+import sys
 from typing import List, Tuple
 
-# 设置文件路径
-file_path = "nodes/node_5.bin"
+# 设置索引文件路径和要查看的页号
+file_path = "rstar.idx"
+page_no = 5
+
+HEADER_STRUCTS = {3: "=4siiiiiii", 4: "=4siiiiiiii", 5: "=4siiiiiiii"}    # 版本3没有叶子页格式字段，版本5内部条目带子树聚合
+# 版本4的叶子页格式：条目结构和量化位数
+# 格式0（mbr）和4（内存树保存的线段长方体）的叶子条目都是 6d+ii，按通用的MBR条目解析
+LEAF_ENTRY_STRUCTS = {1: ("=3dIH", None), 2: ("=3IIH", 32), 3: ("=3HIH", 16)}
 
 
 # 定义MBR结构
@@ -21,19 +28,46 @@ class MBR:
 
 
 # 解析函数
-def parse_node_file(path: str) -> Tuple[int, bool, List[Tuple[MBR, int]]]:
+def parse_node_file(path: str, page_no: int) -> Tuple[int, bool, List[Tuple[MBR, int]]]:
     entries = []
     with open(path, "rb") as f:
+        magic, version = struct.unpack("=4si", f.read(8))
+        f.seek(0)
+        header = struct.unpack(HEADER_STRUCTS[version], f.read(struct.calcsize(HEADER_STRUCTS[version])))
+        page_size = header[2]
+        f.seek(page_no * page_size)
         page_id = struct.unpack("i", f.read(4))[0]
         is_leaf = struct.unpack("?", f.read(1))[0]
+        leaf_format = struct.unpack("b", f.read(1))[0] if version >= 4 else 0
         count = struct.unpack("i", f.read(4))[0]
 
+        if is_leaf and leaf_format in LEAF_ENTRY_STRUCTS:
+            fmt, bits = LEAF_ENTRY_STRUCTS[leaf_format]
+            if bits:
+                box = struct.unpack("6d", f.read(48))   # 本页MBR，量化的基准
+                cells = (1 << bits) - 1
+            for _ in range(count):
+                vals = struct.unpack(fmt, f.read(struct.calcsize(fmt)))
+                if bits:
+                    lo = [box[i] + (box[i + 3] - box[i]) / cells * vals[i] for i in range(3)]
+                    hi = [box[i + 3] if vals[i] + 1 >= cells else box[i] + (box[i + 3] - box[i]) / cells * (vals[i] + 1)
+                          for i in range(3)]
+                    mbr = MBR(*lo, *hi)
+                else:
+                    mbr = MBR(*vals[:3], *vals[:3])
+                entries.append((mbr, (vals[3], vals[4])))
+            return page_id, is_leaf, entries
+
         for _ in range(count):
             mbr_vals = struct.unpack("6d", f.read(48))
             mbr = MBR(*mbr_vals)
             if is_leaf:
                 block_id, index = struct.unpack("ii", f.read(8))
                 entries.append((mbr, (block_id, index)))
+            elif version >= 5:
+                child_id, point_count = struct.unpack("ii", f.read(8))
+                sums = struct.unpack("3d", f.read(24))  # 子树点数和各轴坐标和
+                entries.append((mbr, child_id, point_count, sums))
             else:
                 child_id = struct.unpack("i", f.read(4))[0]
                 entries.append((mbr, child_id))
@@ -41,15 +75,21 @@ def parse_node_file(path: str) -> Tuple[int, bool, List[Tuple[MBR, int]]]:
     return page_id, is_leaf, entries
 
 
-# 调用解析并展示内容
-page_id, is_leaf, entries = parse_node_file(file_path)
-entries_output = {
-    "页号": page_id,
-    "是否为叶节点": is_leaf,
-    "索引条目": entries
-}
-print("页号:"+str(entries_output["页号"]))
-print("是否是叶节点:"+str(entries_output["是否为叶节点"]))
-print("索引条目:")
-for i in range(len(entries_output["索引条目"])):
-    print(entries_output["索引条目"][i])
+if __name__ == "__main__":
+    # 命令行可给出 索引文件 页号；整棵树的统计见 index_stats.py
+    if len(sys.argv) > 1:
+        file_path = sys.argv[1]
+    if len(sys.argv) > 2:
+        page_no = int(sys.argv[2])
+    # 调用解析并展示内容
+    page_id, is_leaf, entries = parse_node_file(file_path, page_no)
+    entries_output = {
+        "页号": page_id,
+        "是否为叶节点": is_leaf,
+        "索引条目": entries
+    }
+    print("页号:"+str(entries_output["页号"]))
+    print("是否是叶节点:"+str(entries_output["是否为叶节点"]))
+    print("索引条目:")
+    for i in range(len(entries_output["索引条目"])):
+        print(entries_output["索引条目"][i])
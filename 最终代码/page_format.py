@@ -0,0 +1,42 @@
+import struct
+
+import numpy as np
+
+#索引文件的分页格式：第0页为超级块，节点从第1页开始按固定页长存放。
+#Rstartree.RStarTreeDisk 和仓库根目录 RstarTree.py 中内存树的保存/加载都用这里的定义，改格式时只改这一处
+INDEX_MAGIC = b"RSTR"
+INDEX_VERSION = 5
+HEADER_STRUCT = "=4siiiiiiii"       #魔数、版本、页长、叶子扇出、内部扇出、根页号、页数、空闲页链表头、叶子页格式
+NODE_HEADER_STRUCT = "=i?bi"        #页号、是否叶子、叶子页格式、条目数（空闲页为-1，其后是下一个空闲页号）
+HEADER_SIZE = struct.calcsize(HEADER_STRUCT)
+#页内条目按结构体数组读写，整页一次比较
+LEAF_DTYPE = np.dtype([("mbr", "=f8", (6,)), ("block", "=i4"), ("index", "=i4")])     #MBR、数据块号、块内位置
+INTERNAL_DTYPE = np.dtype([("mbr", "=f8", (6,)), ("child", "=i4"),                    #MBR、孩子页号、
+                           ("count", "=i4"), ("sum", "=f8", (3,))])                   #子树点数、各轴坐标和（最值即MBR）
+NODE_HEADER_SIZE = struct.calcsize(NODE_HEADER_STRUCT)
+INTERNAL_ENTRY_SIZE = INTERNAL_DTYPE.itemsize
+#点索引叶子页的磁盘格式，读入内存后统一解码成 LEAF_DTYPE：
+#mbr 为退化的6维MBR；point 只存一次坐标；q32/q16 存相对本页MBR量化的格点，查询时回数据块精确判断
+LEAF_FORMATS = {"mbr": 0, "point": 1, "q32": 2, "q16": 3}
+#内存R*树保存的线段长方体叶子：条目结构同 mbr，但不是点，坐标为 (纬度, 经度, 海拔)；RStarTreeDisk 拒绝打开
+CUBOID_LEAF_CODE = 4
+LEAF_PAGE_DTYPES = {
+    0: LEAF_DTYPE,
+    1: np.dtype([("pt", "=f8", (3,)), ("block", "=u4"), ("index", "=u2")]),
+    2: np.dtype([("q", "=u4", (3,)), ("block", "=u4"), ("index", "=u2")]),
+    3: np.dtype([("q", "=u2", (3,)), ("block", "=u4"), ("index", "=u2")]),
+    CUBOID_LEAF_CODE: LEAF_DTYPE,
+}
+QUANT_BITS = {2: 32, 3: 16}
+PAGE_BOX_SIZE = 6 * 8   #量化格式在页头后存本页MBR作为量化基准
+MIN_FILL = 0.4          #动态插入删除时节点的最小填充率；加载没有内存树参数的点索引时也按它取最小条目数
+
+
+#一页能放下的叶子条目数，量化格式要扣掉页头后的本页MBR
+def leaf_capacity(page_size: int, leaf_code: int) -> int:
+    base = NODE_HEADER_SIZE + (PAGE_BOX_SIZE if leaf_code in QUANT_BITS else 0)
+    return (page_size - base) // LEAF_PAGE_DTYPES[leaf_code].itemsize
+
+
+def internal_capacity(page_size: int) -> int:
+    return (page_size - NODE_HEADER_SIZE) // INTERNAL_ENTRY_SIZE
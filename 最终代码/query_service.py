@@ -0,0 +1,272 @@
+import asyncio
+import json
+import random
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from Rstartree import BUFFER_PAGES, INDEX_FILE, MBR, PIN_LEVELS, PRECISION, RStarTreeDisk, generate_query_mbr, get_tree_mbr
+from datafile import DATA_FILE
+
+#常驻的本地查询服务：索引只打开一次，按行协议（每行一个JSON请求/响应）在TCP上服务并发的范围和计数查询
+HOST = "127.0.0.1"
+PORT = 8765
+SERVICE_WORKERS = 4         #执行阻塞读页/读块的线程数
+RANGE_LIMIT = 10000         #范围查询单次最多返回的点数
+LATENCY_WINDOW = 10000      #计算延迟分位数时保留的最近请求数
+PERCENTILES = (50, 95, 99)
+LINE_LIMIT = 2 ** 24        #单行请求/响应的最大字节数
+LOAD_CLIENTS = 16           #压测并发连接数
+LOAD_REQUESTS = 50          #每个连接发送的请求数
+LOAD_HOT = 0                #>0 时所有请求从这么多个查询里抽取，模拟热点查询以观察合并效果
+
+
+#线程安全的缓冲池外壳：同一页的并发未命中只做一次物理读，其余线程等这次读完直接取结果
+class CoalescingPool:
+    def __init__(self, tree: RStarTreeDisk, capacity_pages: int = BUFFER_PAGES, pin_levels: int = PIN_LEVELS):
+        self.pool = tree.enable_buffer_pool(capacity_pages, pin_levels=pin_levels)
+        self.loader = tree.read_node
+        self.capacity = self.pool.capacity
+        self.pinned = self.pool.pinned
+        self._lock = threading.Lock()
+        self._inflight: Dict[int, Future] = {}
+        self.coalesced = 0          #等待别的线程读同一页的次数
+
+    @property
+    def stats(self) -> Counter:
+        return self.pool.stats
+
+    def get(self, page_id: int):
+        with self._lock:
+            if page_id in self.pool:
+                return self.pool.get(page_id)
+            waiter = self._inflight.get(page_id)
+            owner = waiter is None
+            if owner:
+                waiter = self._inflight[page_id] = Future()
+                self.pool.stats["misses"] += 1
+            else:
+                self.coalesced += 1
+        if not owner:
+            return waiter.result()
+        try:
+            node = self.loader(page_id)
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[page_id]
+            waiter.set_exception(e)
+            raise
+        with self._lock:
+            self.pool.put(page_id, node)
+            del self._inflight[page_id]
+        waiter.set_result(node)
+        return node
+
+    def snapshot(self) -> Counter:
+        with self._lock:
+            return self.pool.snapshot()
+
+
+#一组延迟（毫秒）的分位数
+def latency_summary(latencies) -> Dict:
+    if not len(latencies):
+        return {f"p{p}ms": None for p in PERCENTILES}
+    values = np.percentile(np.asarray(latencies, dtype=float), PERCENTILES)
+    return {f"p{p}ms": round(float(v), 3) for p, v in zip(PERCENTILES, values)}
+
+
+class QueryService:
+    def __init__(self, index_path: str = INDEX_FILE, data_path: str = DATA_FILE, workers: int = SERVICE_WORKERS,
+                 buffer_pages: int = BUFFER_PAGES, pin_levels: int = PIN_LEVELS):
+        self.tree = RStarTreeDisk.open(index_path, data_path)
+        self.tree.buffer_pool = self.pages = CoalescingPool(self.tree, buffer_pages, pin_levels)
+        self.root_mbr = get_tree_mbr(self.tree)
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="query")
+        self._inflight: Dict[Tuple, asyncio.Future] = {}   #相同请求正在执行时直接共享结果
+        self.started = time.perf_counter()
+        self.counts = Counter()     #按操作统计：请求数、合并数、错误数
+        self.latencies = {op: deque(maxlen=LATENCY_WINDOW) for op in ("range", "count")}
+        self.active = 0
+        self.server = None
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.tree.close()
+
+    #在工作线程里执行的阻塞查询
+    def _execute(self, op: str, box: Tuple, limit: int) -> Dict:
+        node_io, block_io = Counter(), Counter()
+        query = MBR(*box)
+        if op == "count":
+            result = {"count": self.tree.range_count(query, node_io, block_io)}
+        else:#多取一个点判断是否被截断
+            points = list(self.tree.range_query(query, limit + 1, node_io, block_io))
+            result = {"points": points[:limit], "truncated": len(points) > limit}
+        result.update(node_io=sum(node_io.values()), block_io=sum(block_io.values()))
+        return result
+
+    #查询请求：相同 (操作, 查询框, 上限) 的并发请求只执行一次
+    async def _query(self, op: str, request: Dict) -> Dict:
+        box = tuple(float(v) for v in request["box"])
+        if len(box) != 6:
+            raise ValueError("box 需要 6 个数：minx, miny, minz, maxx, maxy, maxz")
+        limit = int(request.get("limit", RANGE_LIMIT)) if op == "range" else 0
+        key = (op, box, limit)
+        future = self._inflight.get(key)
+        if future is not None:
+            self.counts[op + "_coalesced"] += 1
+            return await asyncio.shield(future)
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, self._execute, op, box, limit)
+        self._inflight[key] = future
+        try:
+            return await asyncio.shield(future)
+        finally:
+            self._inflight.pop(key, None)
+
+    async def dispatch(self, request: Dict) -> Dict:
+        op = request.get("op")
+        if op in self.latencies:
+            start = time.perf_counter()
+            result = await self._query(op, request)
+            self.latencies[op].append((time.perf_counter() - start) * 1000)
+            self.counts[op] += 1
+            return result
+        if op == "stats":
+            return self.stats()
+        if op == "info":
+            return {"root_mbr": list(self.root_mbr.to_tuple()), "page_size": self.tree.page_size,
+                    "height": self.tree.height, "page_count": self.tree.page_count,
+                    "leaf_format": self.tree.leaf_format}
+        raise ValueError(f"未知操作 {op!r}")
+
+    #延迟/吞吐量计数器
+    def stats(self) -> Dict:
+        uptime = time.perf_counter() - self.started
+        completed = sum(self.counts[op] for op in self.latencies)
+        pool = self.pages.snapshot()
+        return {"uptime_s": round(uptime, 3), "completed": completed, "active": self.active,
+                "throughput_qps": round(completed / uptime, 3) if uptime else 0.0,
+                "requests": dict(self.counts),
+                "latency": {op: {"n": len(lat), **latency_summary(lat)} for op, lat in self.latencies.items()},
+                "pages": {"hits": pool["hits"], "misses": pool["misses"], "evictions": pool["evictions"],
+                          "coalesced": self.pages.coalesced}}
+
+    #一个连接上按顺序处理请求；单个请求出错只回错误，不断开连接
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                self.active += 1
+                try:
+                    response = {"ok": True, **await self.dispatch(json.loads(line))}
+                except (ValueError, KeyError, TypeError, AttributeError) as e:
+                    self.counts["errors"] += 1
+                    response = {"ok": False, "error": str(e)}
+                finally:
+                    self.active -= 1
+                writer.write(json.dumps(response, ensure_ascii=False).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, ValueError):#连接断开或单行超过 LINE_LIMIT
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host: str = HOST, port: int = PORT):
+        self.server = await asyncio.start_server(self.handle_client, host, port, limit=LINE_LIMIT)
+        return self.server
+
+    async def serve_forever(self, host: str = HOST, port: int = PORT):
+        await self.start(host, port)
+        async with self.server:
+            await self.server.serve_forever()
+
+
+async def connect(host: str = HOST, port: int = PORT) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    return await asyncio.open_connection(host, port, limit=LINE_LIMIT)
+
+
+#客户端：发一个请求等一行响应
+async def request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, message: Dict) -> Dict:
+    writer.write(json.dumps(message).encode() + b"\n")
+    await writer.drain()
+    return json.loads(await reader.readline())
+
+
+#压测中的一个连接：依次发送自己那份请求，记录每个请求的往返延迟
+async def _load_client(host: str, port: int, messages: List[Dict], latencies: List[float], errors: Counter):
+    reader, writer = await connect(host, port)
+    try:
+        for message in messages:
+            start = time.perf_counter()
+            response = await request(reader, writer, message)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if not response.get("ok"):
+                errors[response.get("error")] += 1
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+
+#本地压测：clients 个并发连接各发 requests 个查询，返回客户端视角的吞吐量和延迟分位数以及服务端计数器
+async def run_load(host: str = HOST, port: int = PORT, clients: int = LOAD_CLIENTS, requests: int = LOAD_REQUESTS,
+                   op: str = "range", precision: float = PRECISION, hot: int = LOAD_HOT, seed: int = 0) -> Dict:
+    reader, writer = await connect(host, port)
+    root_mbr = MBR(*(await request(reader, writer, {"op": "info"}))["root_mbr"])
+    rng = random.Random(seed)
+    pool = [generate_query_mbr(root_mbr, precision, rng=rng) for _ in range(hot or clients * requests)]
+    messages = [[{"op": op, "box": list(rng.choice(pool).to_tuple() if hot else pool[c * requests + i].to_tuple())}
+                 for i in range(requests)] for c in range(clients)]
+    latencies, errors = [], Counter()
+    start = time.perf_counter()
+    await asyncio.gather(*(_load_client(host, port, m, latencies, errors) for m in messages))
+    wall = time.perf_counter() - start
+    server = await request(reader, writer, {"op": "stats"})
+    writer.close()
+    await writer.wait_closed()
+    return {"clients": clients, "requests": len(latencies), "errors": dict(errors), "wall_s": round(wall, 3),
+            "throughput_qps": round(len(latencies) / wall, 3), **latency_summary(latencies), "server": server}
+
+
+#同一进程内起服务再压测，便于在本机直接测量
+async def serve_and_load(index_path: str = INDEX_FILE, data_path: str = DATA_FILE, port: int = 0, **load_args) -> Dict:
+    service = QueryService(index_path, data_path)
+    try:
+        server = await service.start(HOST, port)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            return await run_load(HOST, port, **load_args)
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    mode = "bench" #设置程序执行模式
+    #常驻服务：python query_service.py 后用 load 模式或任意按行发送JSON的客户端连接
+    if mode == "serve":
+        service = QueryService(INDEX_FILE, DATA_FILE)
+        print(f"[INFO] 服务 {HOST}:{PORT}，树高 {service.tree.height}，{SERVICE_WORKERS} 个工作线程")
+        try:
+            asyncio.run(service.serve_forever(HOST, PORT))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            service.close()
+    #对已运行的服务压测
+    elif mode == "load":
+        print(json.dumps(asyncio.run(run_load(HOST, PORT)), ensure_ascii=False, indent=1))
+    #本机一体化测量：分散查询和热点查询各跑一遍，对比请求合并的效果
+    elif mode == "bench":
+        for hot in (0, 20):
+            result = asyncio.run(serve_and_load(INDEX_FILE, DATA_FILE, hot=hot))
+            server = result.pop("server")
+            print(f"热点查询数 {hot or '-'}: {result}")
+            print(f"  服务端: 请求 {server['requests']}，读页 {server['pages']}")
@@ -1,26 +1,78 @@
 import os
-import struct
+import glob
+import time
+import multiprocessing
+import numpy as np
+from curves import curve_order
+from datafile import BLOCK_SIZE, DATA_FILE, POINT_SIZE, DataFile, cluster_data_file, order_path
 
-BLOCK_SIZE = 8192
-FLOAT_SIZE = 8
-POINT_SIZE = FLOAT_SIZE * 3
+PLT_HEADER_LINES = 6        # GeoLife .plt 文件开头的说明行数
+PLT_EPOCH_DAYS = 25569.0    # 1970-01-01 距 .plt 日数起点 1899-12-30 的天数
+WORKERS = os.cpu_count()
+LAYOUT = 'file'             # 数据块布局：file（按轨迹文件顺序）/ hilbert / zorder（沿空间填充曲线聚簇）
 
 
+#解析 GeoLife .plt 文件：跳过6行表头，每行为 纬度,经度,0,海拔,日数,日期,时间；返回 n×3 的 (经度, 纬度, 海拔) 数组
 def parse_plt_file(file_path):
-    points = []
+    rows = []
     with open(file_path, 'r') as f:
+        for _ in range(PLT_HEADER_LINES):
+            f.readline()
         for line in f:
+            parts = line.split(',')
+            if len(parts) < 4:
+                continue
+            try:
+                rows.append((float(parts[1]), float(parts[0]), float(parts[3])))
+            except ValueError:
+                continue
+    return np.array(rows, dtype='<f8').reshape(-1, 3)
+
+
+#解析 .plt 文件并保留时间：返回 n×4 的 (经度, 纬度, 海拔, Unix秒) 数组，时间取自第5列的日数（1899-12-30起）
+def parse_plt_track(file_path):
+    rows = []
+    with open(file_path, 'r') as f:
+        for _ in range(PLT_HEADER_LINES):
+            f.readline()
+        for line in f:
+            parts = line.split(',')
+            if len(parts) < 5:
+                continue
             try:
-                parts = line.strip().split()
-                if len(parts) != 3:
-                    continue
-                lat = float(parts[0])
-                lon = float(parts[1])
-                alt = float(parts[2])
-                points.append((lat, lon, alt))
+                rows.append((float(parts[1]), float(parts[0]), float(parts[3]),
+                             (float(parts[4]) - PLT_EPOCH_DAYS) * 86400.0))
             except ValueError:
                 continue
-    return points
+    return np.array(rows, dtype='<f8').reshape(-1, 4)
+
+
+def find_plt_files(dataset_dir='dataset'):
+    return sorted(glob.glob(os.path.join(dataset_dir, '*', 'Trajectory', '*.plt')))
+
+
+#并行解析 dataset/*/Trajectory/*.plt，按文件顺序流式追加到数据文件，跨文件的零头自动接到下一块；
+#聚簇布局下再整体沿曲线重排并保存回到原始顺序的映射
+def ingest_dataset(dataset_dir='dataset', output_path=DATA_FILE, workers=WORKERS, layout=LAYOUT):
+    start = time.perf_counter()
+    files = find_plt_files(dataset_dir)
+    with DataFile.create(output_path) as data, multiprocessing.Pool(workers) as pool:
+        for points in pool.imap(parse_plt_file, files, chunksize=16):
+            data.append(points)
+        point_count, block_count = data.point_count, len(data)
+    if layout != 'file':
+        cluster_data_file(output_path, output_path, layout)
+    elapsed = time.perf_counter() - start
+    print(f"解析 {len(files)} 个文件，{point_count} 个点写入 {block_count} 个块，"
+          f"用时 {elapsed:.2f}s，{point_count / elapsed:.0f} 点/秒")
+    return point_count, block_count, elapsed
+
+
+#按布局重排点，返回 (重排后的点, order)，order[i] 为第 i 个点在原始轨迹顺序中的位置
+def cluster_points(points, layout=LAYOUT):
+    points = np.asarray(points, dtype='<f8').reshape(-1, 3)
+    order = np.arange(len(points)) if layout == 'file' else curve_order(points, layout)
+    return points[order], order
 
 
 def pack_points_to_blocks(points):
@@ -46,22 +98,21 @@ def pack_points_to_blocks(points):
     return blocks
 
 
-def write_blocks_to_files(blocks, output_dir='blocks'):
+def write_blocks_to_file(blocks, output_path=DATA_FILE, order=None):
 
-    os.makedirs(output_dir, exist_ok=True)
-
-    for block_index, block_points in blocks:
-        file_path = os.path.join(output_dir, f"block_{block_index}.bin")
-        with open(file_path, 'wb') as f:
-            for pt in block_points:
-                f.write(struct.pack('ddd', pt[0], pt[1], pt[2]))  # float64
+    with DataFile.create(output_path) as data:
+        for block_index, block_points in blocks:
+            data.append(np.asarray(block_points, dtype='<f8'))  # float64，整块一次写入
 
-        print(f" 写入块文件: {file_path}（包含 {len(block_points)} 个点）")
+        print(f" 写入数据文件: {output_path}（{len(data)} 个块，{data.point_count} 个点）")
+    if order is not None:
+        np.save(order_path(output_path), order)
 
 
 def main(plt_path):
     points = parse_plt_file(plt_path)
     print(f"Loaded {len(points)} points.")
+    points, order = cluster_points(points)
 
     blocks = pack_points_to_blocks(points)
     print(f"Packed into {len(blocks)} blocks.")
@@ -72,12 +123,12 @@ def main(plt_path):
         print(f"Block {block_index}: MBR = {mbr}")
 
     #写入文件
-    write_blocks_to_files(blocks)
+    write_blocks_to_file(blocks, order=order if LAYOUT != 'file' else None)
 
 
 def compute_mbr(block_points):
-    lats = [p[0] for p in block_points]
-    lons = [p[1] for p in block_points]
+    lons = [p[0] for p in block_points]
+    lats = [p[1] for p in block_points]
     alts = [p[2] for p in block_points]
     return {
         'min_lat': min(lats),
@@ -90,4 +141,4 @@ def compute_mbr(block_points):
 
 
 if __name__ == '__main__':
-    main("output.plt")
+    ingest_dataset('dataset')
@@ -0,0 +1,252 @@
+import json
+import mmap
+import struct
+from collections import Counter
+from math import ceil
+from typing import Iterator, List, Tuple
+
+import numpy as np
+
+from buffer_pool import BufferPool
+from Rstartree import MBR, group_sizes
+from save import find_plt_files, parse_plt_track
+
+#轨迹线段的四维（经度, 纬度, 海拔, 时间）索引：叶子存整条线段和所属轨迹，内部节点存四维MBR
+SEGMENT_INDEX_FILE = "segments.idx"
+SEGMENT_PAGE_SIZE = 4096
+SEGMENT_MAGIC = b"SEG4"
+SEGMENT_VERSION = 1
+DIMS = 4
+SEGMENT_HEADER_STRUCT = "=4siiiiii"     #魔数、版本、页长、叶子扇出、内部扇出、根页号、页数
+SEGMENT_NODE_HEADER_STRUCT = "=i?i"     #页号、是否叶子、条目数
+SEGMENT_NODE_HEADER_SIZE = struct.calcsize(SEGMENT_NODE_HEADER_STRUCT)
+SEGMENT_DTYPE = np.dtype([("p0", "=f8", (DIMS,)), ("p1", "=f8", (DIMS,)),     #起点、终点
+                          ("traj", "=i4"), ("seq", "=i4")])                   #轨迹号、轨迹内第几段
+SEGMENT_INTERNAL_DTYPE = np.dtype([("mbr", "=f8", (2 * DIMS,)), ("child", "=i4")])
+TRAJ_SUFFIX = ".trajs"                  #轨迹号到 .plt 路径的对照表
+
+
+#线段的四维MBR（前4列下界，后4列上界）
+def segment_bounds(segments: np.ndarray) -> np.ndarray:
+    return np.hstack([np.minimum(segments["p0"], segments["p1"]), np.maximum(segments["p0"], segments["p1"])])
+
+
+#把一条轨迹的相邻点连成线段
+def track_segments(track: np.ndarray, traj_id: int) -> np.ndarray:
+    segments = np.zeros(max(len(track) - 1, 0), SEGMENT_DTYPE)
+    segments["p0"], segments["p1"] = track[:-1], track[1:]
+    segments["traj"] = traj_id
+    segments["seq"] = np.arange(len(segments))
+    return segments
+
+
+#四维的Sort-Tile-Recursive次序：按各轴中心依次切片，最后一轴片内排序
+def str_order(centers: np.ndarray, per_page: int) -> np.ndarray:
+    dims = centers.shape[1]
+
+    def tile(idx: np.ndarray, axis: int) -> np.ndarray:
+        idx = idx[np.argsort(centers[idx, axis], kind="stable")]
+        if axis == dims - 1:
+            return idx
+        pages = ceil(len(idx) / per_page)
+        slabs = ceil(pages ** (1 / (dims - axis)))
+        per_slab = ceil(pages / slabs) * per_page
+        return np.concatenate([tile(idx[i:i + per_slab], axis + 1) for i in range(0, len(idx), per_slab)])
+
+    return tile(np.arange(len(centers)), 0) if len(centers) else np.arange(0)
+
+
+#查询窗口：空间立方体加时间区间，时间端点为 None 时不限
+def query_window(query: MBR, t_start: float = None, t_end: float = None) -> Tuple[np.ndarray, np.ndarray]:
+    q = query.to_tuple()
+    lo = np.array(q[:3] + (-np.inf if t_start is None else t_start,))
+    hi = np.array(q[3:] + (np.inf if t_end is None else t_end,))
+    return lo, hi
+
+
+#线段是否真的穿过查询窗口：按参数 u∈[0,1] 在四个轴上求与窗口的交区间（Liang-Barsky），非空即穿过
+def segments_cross(segments: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    p0, d = segments["p0"], segments["p1"] - segments["p0"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        a, b = (lo - p0) / d, (hi - p0) / d
+    enter = np.where(d == 0, np.where((p0 >= lo) & (p0 <= hi), -np.inf, np.inf), np.minimum(a, b))
+    leave = np.where(d == 0, np.where((p0 >= lo) & (p0 <= hi), np.inf, -np.inf), np.maximum(a, b))
+    u0 = np.maximum(enter.max(axis=1), 0.0)
+    u1 = np.minimum(leave.min(axis=1), 1.0)
+    return u0 <= u1
+
+
+class SegmentIndex:
+    def __init__(self, index_path: str = SEGMENT_INDEX_FILE, page_size: int = SEGMENT_PAGE_SIZE):
+        self.index_path = index_path
+        self.page_size = page_size
+        self.leaf_fanout = (page_size - SEGMENT_NODE_HEADER_SIZE) // SEGMENT_DTYPE.itemsize
+        self.internal_fanout = (page_size - SEGMENT_NODE_HEADER_SIZE) // SEGMENT_INTERNAL_DTYPE.itemsize
+        self.root_page = None
+        self.next_page_id = 1           #第0页留给超级块
+        self.trajectories: List[str] = []
+        self.buffer_pool = None
+        self._file = None
+        self._mm = None
+
+    @classmethod
+    def open(cls, index_path: str = SEGMENT_INDEX_FILE) -> "SegmentIndex":
+        with open(index_path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, page_size, leaf_fanout, internal_fanout, root_page, page_count = \
+            struct.unpack_from(SEGMENT_HEADER_STRUCT, mm, 0)
+        if magic != SEGMENT_MAGIC or version != SEGMENT_VERSION:
+            mm.close()
+            raise ValueError(f"{index_path} 不是有效的线段索引文件")
+        index = cls(index_path, page_size)
+        index.leaf_fanout, index.internal_fanout = leaf_fanout, internal_fanout
+        index.root_page, index.next_page_id = root_page, page_count
+        index._mm = mm
+        try:
+            with open(index_path + TRAJ_SUFFIX, encoding="utf-8") as f:
+                index.trajectories = json.load(f)
+        except FileNotFoundError:
+            pass
+        return index
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def page_count(self) -> int:
+        return self.next_page_id
+
+    #解析 dataset/*/Trajectory/*.plt，每个文件一条轨迹，轨迹号为文件的排序序号
+    def build_from_plt(self, dataset_dir: str = "dataset"):
+        files = find_plt_files(dataset_dir)
+        segments = np.concatenate([track_segments(parse_plt_track(path), traj_id)
+                                   for traj_id, path in enumerate(files)] or [np.zeros(0, SEGMENT_DTYPE)])
+        self.build(segments, files)
+
+    #批量装载：线段按四维STR次序装满叶子，再逐层向上打包
+    def build(self, segments: np.ndarray, trajectories: List[str] = ()):
+        self.trajectories = list(trajectories)
+        self.next_page_id = 1
+        bounds = segment_bounds(segments)
+        order = str_order((bounds[:, :DIMS] + bounds[:, DIMS:]) / 2, self.leaf_fanout)
+        segments, bounds = segments[order], bounds[order]
+        with open(self.index_path, "wb") as f:
+            self._file = f
+            level = self._write_level(True, segments, bounds)
+            while len(level) > 1:
+                bounds = level["mbr"]
+                order = str_order((bounds[:, :DIMS] + bounds[:, DIMS:]) / 2, self.internal_fanout)
+                level = self._write_level(False, level[order], bounds[order])
+            self.root_page = int(level["child"][0])
+            f.seek(0)
+            f.write(struct.pack(SEGMENT_HEADER_STRUCT, SEGMENT_MAGIC, SEGMENT_VERSION, self.page_size,
+                                self.leaf_fanout, self.internal_fanout, self.root_page,
+                                self.next_page_id).ljust(self.page_size, b"\0"))
+        self._file = None
+        with open(self.index_path + TRAJ_SUFFIX, "w", encoding="utf-8") as f:
+            json.dump(self.trajectories, f, ensure_ascii=False)
+
+    #把一层条目按 group_sizes 分页写出，返回上一层的 (MBR, 页号) 条目
+    def _write_level(self, is_leaf: bool, records: np.ndarray, bounds: np.ndarray) -> np.ndarray:
+        sizes = group_sizes(len(records), self.leaf_fanout if is_leaf else self.internal_fanout) or [0]
+        parents = np.zeros(len(sizes), SEGMENT_INTERNAL_DTYPE)
+        start = 0
+        for i, size in enumerate(sizes):
+            page_id = self.next_page_id
+            self.next_page_id += 1
+            page = bytearray(self.page_size)
+            struct.pack_into(SEGMENT_NODE_HEADER_STRUCT, page, 0, page_id, is_leaf, size)
+            data = records[start:start + size].tobytes()
+            page[SEGMENT_NODE_HEADER_SIZE:SEGMENT_NODE_HEADER_SIZE + len(data)] = data
+            self._file.seek(page_id * self.page_size)
+            self._file.write(page)
+            if size:
+                parents["mbr"][i, :DIMS] = bounds[start:start + size, :DIMS].min(axis=0)
+                parents["mbr"][i, DIMS:] = bounds[start:start + size, DIMS:].max(axis=0)
+            parents["child"][i] = page_id
+            start += size
+        return parents
+
+    def read_node(self, page_id: int) -> Tuple[bool, np.ndarray]:
+        base = page_id * self.page_size
+        _, is_leaf, count = struct.unpack_from(SEGMENT_NODE_HEADER_STRUCT, self._mm, base)
+        dtype = SEGMENT_DTYPE if is_leaf else SEGMENT_INTERNAL_DTYPE
+        return is_leaf, np.frombuffer(self._mm, dtype, count, base + SEGMENT_NODE_HEADER_SIZE).copy()
+
+    def enable_buffer_pool(self, capacity_pages: int = 1024) -> BufferPool:
+        self.buffer_pool = BufferPool(self.read_node, capacity_pages, page_size=self.page_size)
+        return self.buffer_pool
+
+    def get_node(self, page_id: int) -> Tuple[bool, np.ndarray]:
+        if self.buffer_pool is None:
+            return self.read_node(page_id)
+        return self.buffer_pool.get(page_id)
+
+    #整个索引的四维范围
+    def extent(self) -> Tuple[np.ndarray, np.ndarray]:
+        is_leaf, entries = self.read_node(self.root_page)
+        mbrs = segment_bounds(entries) if is_leaf else entries["mbr"]
+        return mbrs[:, :DIMS].min(axis=0), mbrs[:, DIMS:].max(axis=0)
+
+    #遍历时四个轴一起剪枝，时间窗口外的子树不会被访问；exact 为真时只留真正穿过窗口的线段
+    def iter_segments(self, lo: np.ndarray, hi: np.ndarray, node_io: Counter = None,
+                      exact: bool = True) -> Iterator[np.ndarray]:
+        node_io = Counter() if node_io is None else node_io
+        stack = [self.root_page]
+        while stack:
+            page_id = stack.pop()
+            node_io[page_id] += 1
+            is_leaf, entries = self.get_node(page_id)
+            mbrs = segment_bounds(entries) if is_leaf else entries["mbr"]
+            mask = np.all(mbrs[:, :DIMS] <= hi, axis=1) & np.all(mbrs[:, DIMS:] >= lo, axis=1)
+            if not is_leaf:
+                stack.extend(reversed(entries["child"][mask].tolist()))
+                continue
+            hits = entries[mask]
+            if exact and len(hits):
+                hits = hits[segments_cross(hits, lo, hi)]
+            if len(hits):
+                yield hits
+
+    #时间段 [t_start, t_end] 内穿过空间立方体的线段，返回 SEGMENT_DTYPE 结构体数组
+    def range_segments(self, query: MBR, t_start: float = None, t_end: float = None,
+                       node_io: Counter = None, exact: bool = True) -> np.ndarray:
+        lo, hi = query_window(query, t_start, t_end)
+        parts = list(self.iter_segments(lo, hi, node_io, exact))
+        return np.concatenate(parts) if parts else np.zeros(0, SEGMENT_DTYPE)
+
+    #时间段内经过空间立方体的轨迹号（升序去重）
+    def range_trajectories(self, query: MBR, t_start: float = None, t_end: float = None,
+                           node_io: Counter = None, exact: bool = True) -> List[int]:
+        lo, hi = query_window(query, t_start, t_end)
+        found = set()
+        for hits in self.iter_segments(lo, hi, node_io, exact):
+            found.update(hits["traj"].tolist())
+        return sorted(found)
+
+
+if __name__ == "__main__":
+    mode = "query" #设置程序执行模式
+    if mode == "build":
+        index = SegmentIndex()
+        index.build_from_plt("dataset")
+        print(f"[INFO] 线段索引构建完成，根节点为第 {index.root_page} 页，共 {index.page_count} 页")
+    elif mode == "query":
+        with SegmentIndex.open() as index:
+            lo, hi = index.extent()
+            mid = (lo + hi) / 2
+            span = (hi - lo) * 0.05
+            query = MBR(*(mid[:3] - span[:3]).tolist(), *(mid[:3] + span[:3]).tolist())
+            node_io = Counter()
+            trajs = index.range_trajectories(query, mid[3] - span[3], mid[3] + span[3], node_io)
+            print(f"经过查询范围的轨迹 {len(trajs)} 条，节点IO {sum(node_io.values())}")
+            for traj_id in trajs[:10]:
+                print(traj_id, index.trajectories[traj_id] if traj_id < len(index.trajectories) else "")